@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对抗输入基准：用畸形存档验证解析耗时随输入线性增长，且不会卡死 GUI 工作线程
+
+ - 用例: 超大单事件、未闭合字符串、括号不配对、深层嵌套、超长数字/单词/空行、随机变异的合成存档
+ - 每个用例在 --base 与 --base × --factor 两个体量下各跑一次，均在独立子进程中执行，
+   超过 --time-limit 秒即强制结束并判为失败（防止回溯爆炸把本脚本也拖住）
+ - 耗时比超过 factor × --slack 判为非线性；小于 --min-time 的用例只检查时限，避免计时噪声误报
+ - EXPECT 中的用例另检查解析结果：如 huge_event 中格式完整的超大事件（远超 64 KB）必须照常解析出来
+
+用法:
+  python 性能测试/bench_adversarial.py
+  python 性能测试/bench_adversarial.py --base 2000000 --factor 4 --time-limit 20 -o adversarial.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import multiprocessing
+from typing import Callable, Dict, List, Any, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '最新版本源码'))
+sys.path.insert(0, HERE)
+from core_loader import make_generator, quiet  # noqa: E402
+from gen_synthetic_save import SyntheticSave  # noqa: E402
+
+HEADER = 'version="Adversarial v1.0"\nname="对抗测试存档"\ncountry={\n\t0={\n\t\ttimeline_events={\n'
+FOOTER = '\t\t}\n\t}\n}\n'
+EVENT = '\t\t\t{\n\t\t\t\tdate="2200.01.01"\n\t\t\t\tdefinition="timeline_first_contact"\n\t\t\t\tdata={\n\t\t\t\t\t0 5\n\t\t\t\t}\n\t\t\t}\n'
+
+
+def _events(n: int) -> str:
+    return EVENT * max(1, n // len(EVENT))
+
+
+def _event_with_data(body: str) -> str:
+    return f'\t\t\t{{\n\t\t\t\tdate="2200.01.02"\n\t\t\t\tdefinition="timeline_new_colony"\n\t\t\t\tdata={{ {body} }}\n\t\t\t}}\n'
+
+
+# 每个用例: 体量 n（字节，近似） -> 时间线内容；正常事件夹在两侧，确认畸形事件之后仍能继续解析
+CASES: Dict[str, Callable[[int], str]] = {
+    'huge_event': lambda n: _events(4096) + _event_with_data(f'planet="{"x" * n}"') + _events(4096),
+    'unterminated_string': lambda n: _events(4096) + _event_with_data('planet="' + 'a b=' * (n // 4)) + _events(4096),
+    'unterminated_quotes': lambda n: _events(4096) + ('\t\t\t{\n\t\t\t\tdate="2200.01.03\n\t\t\t\tdefinition="timeline_x\n\t\t\t}\n' * (n // 60)) + _events(4096),
+    'repeated_keys': lambda n: _events(4096) + _event_with_data('date="' * (n // 6)) + _events(4096),
+    'unbalanced_open': lambda n: _events(n // 2) + '\t\t\t{\n' * (n // 8) + _events(4096),
+    'unbalanced_close': lambda n: _events(4096) + '\t\t\t}\n' * (n // 5) + _events(n // 2),
+    'deep_nesting': lambda n: _events(4096) + '{' * (n // 2) + '}' * (n // 2) + _events(4096),
+    'digit_run': lambda n: _events(4096) + _event_with_data('1' * n + ' x') + _events(4096),
+    'word_run': lambda n: _events(4096) + _event_with_data('w' * n + ' = x') + _events(4096),
+    'blank_lines': lambda n: _events(4096) + _event_with_data('0' + '\n' * n + 'x') + _events(4096),
+    'whitespace_run': lambda n: _events(4096) + _event_with_data('k' + ' ' * n + 'x') + _events(4096),
+    'many_events': lambda n: _events(n),
+}
+
+
+# 用例 → 检查解析结果（res 含 n 即畸形片段体量），返回问题描述或 None
+EXPECT: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    'huge_event': lambda r: None if r['longest_value'] >= r['n'] and not r['skipped']
+    else f"格式完整的超大事件未被解析（最长值 {r['longest_value']} 字符，跳过 {r['skipped']} 个）",
+}
+
+
+def fuzz_case(n: int, seed: int) -> str:
+    """对合成存档做随机字节级变异：删除/复制括号与引号、插入乱码"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'base.txt')
+        SyntheticSave(max(100, n // 100), 0, 4, 1, seed).write(path, False)
+        with open(path, encoding='utf-8') as f:
+            text = list(f.read())
+    rng = random.Random(seed)
+    for _ in range(max(1, len(text) // 200)):
+        i = rng.randrange(len(text))
+        op = rng.random()
+        if op < 0.3 and text[i] in '{}"=':
+            text[i] = ''
+        elif op < 0.6:
+            text[i] += rng.choice('{}"=\n\t ') * rng.randint(1, 8)
+        else:
+            text[i] += ''.join(chr(rng.randrange(0x20, 0x3000)) for _ in range(rng.randint(1, 16)))
+    return ''.join(text)
+
+
+def _worker(path: str, queue):
+    gen = make_generator()
+    with quiet():
+        t0 = time.perf_counter()
+        ok = gen.parse_save_file(path)
+        wall = time.perf_counter() - t0
+    longest = max((len(v) for ev in gen.timeline_events for v in ev.data.values() if isinstance(v, str)), default=0)
+    queue.put({'ok': ok, 'wall_s': wall, 'events': len(gen.timeline_events), 'skipped': gen.skipped_events,
+               'longest_value': longest})
+
+
+def run_case(text: str, time_limit: float) -> Dict[str, Any]:
+    """在子进程中解析，超时即终止"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gamestate')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=_worker, args=(path, queue), daemon=True)
+        proc.start()
+        proc.join(time_limit)
+        if proc.is_alive():
+            proc.terminate(); proc.join()
+            return {'ok': False, 'timeout': True, 'wall_s': None, 'bytes': len(text)}
+        try:
+            res = queue.get(timeout=1)
+        except Exception:
+            return {'ok': False, 'crashed': True, 'exitcode': proc.exitcode, 'wall_s': None, 'bytes': len(text)}
+        res['bytes'] = len(text)
+        return res
+
+
+def evaluate(name: str, small: Dict[str, Any], large: Dict[str, Any], factor: int,
+             slack: float, min_time: float) -> Optional[str]:
+    for r in (small, large):
+        if r.get('timeout'):
+            return f"{name}: {r['bytes'] / 1048576:.1f} MB 输入超出时限"
+        if r.get('crashed'):
+            return f"{name}: 解析进程异常退出 (exitcode {r['exitcode']})"
+    if large['wall_s'] < min_time:
+        return None
+    ratio = large['wall_s'] / max(small['wall_s'], 1e-6)
+    size_ratio = large['bytes'] / max(small['bytes'], 1)
+    if ratio > size_ratio * slack:
+        return f"{name}: 输入增大 {size_ratio:.1f} 倍，耗时增大 {ratio:.1f} 倍（疑似超线性）"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对抗/模糊输入下的解析耗时基准')
+    parser.add_argument('--base', type=int, default=500_000, help='较小体量的畸形片段字节数（默认 500000）')
+    parser.add_argument('--factor', type=int, default=4, help='较大体量相对较小体量的倍数（默认 4）')
+    parser.add_argument('--time-limit', type=float, default=30.0, help='单次解析的时限秒数（默认 30）')
+    parser.add_argument('--slack', type=float, default=2.0, help='允许耗时比超过体量比的倍数（默认 2）')
+    parser.add_argument('--min-time', type=float, default=0.05, help='较大体量耗时低于该秒数时不判断线性（默认 0.05）')
+    parser.add_argument('--fuzz', type=int, default=5, help='随机变异用例数（默认 5）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cases', help='只运行指定用例，逗号分隔')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径')
+    args = parser.parse_args()
+
+    cases = {name: (lambda n, body=body: HEADER + body(n) + FOOTER) for name, body in CASES.items()}
+    for i in range(args.fuzz):
+        cases[f'fuzz_{i}'] = lambda n, s=args.seed + i: fuzz_case(n, s)
+    if args.cases:
+        wanted = [c.strip() for c in args.cases.split(',')]
+        unknown = [c for c in wanted if c not in cases]
+        if unknown:
+            parser.error(f"未知用例: {', '.join(unknown)}")
+        cases = {c: cases[c] for c in wanted}
+
+    results, failures = {}, []
+    for name, build in cases.items():
+        small = run_case(build(args.base), args.time_limit)
+        large = run_case(build(args.base * args.factor), args.time_limit)
+        problem = evaluate(name, small, large, args.factor, args.slack, args.min_time)
+        if not problem and name in EXPECT:
+            for r, n in ((small, args.base), (large, args.base * args.factor)):
+                problem = problem or (lambda msg: msg and f"{name}: {msg}")(EXPECT[name](dict(r, n=n)))
+        results[name] = {'small': small, 'large': large, 'problem': problem}
+        fmt = lambda r: '超时' if r['wall_s'] is None else f"{r['wall_s']:.3f}s"
+        detail = '' if large['wall_s'] is None else f"  事件 {large['events']} / 跳过 {large['skipped']}"
+        print(f"  {'❌' if problem else '✅'} {name:<20} {small['bytes'] / 1048576:6.2f} MB {fmt(small):>8}  →  "
+              f"{large['bytes'] / 1048576:6.2f} MB {fmt(large):>8}{detail}")
+        if problem:
+            failures.append(problem)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已保存: {args.output}")
+    if failures:
+        print("\n❌ 发现问题:")
+        for f in failures:
+            print(f"  - {f}")
+        sys.exit(1)
+    print("\n✅ 所有对抗用例均在时限内完成且耗时随输入线性增长")
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行解析的核数扩展基准：同一份大时间线分别用 1/2/4/... 个进程解析
+
+ - 指标: 解析阶段墙钟（多次取最快）、相对单进程的加速比与并行效率
+ - 每个进程数的解析结果（日期、代码、data、原文区间）都与单进程逐条比对，不一致即以退出码 1 失败
+ - 合成存档缓存在 --corpus-dir，重复运行不会重新生成
+
+用法:
+  python 性能测试/bench_parallel_parse.py --events 400000
+  python 性能测试/bench_parallel_parse.py --events 1000000 --workers 1,2,4,8 -o parallel.json
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import multiprocessing
+from typing import Dict, List, Any
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '最新版本源码'))
+sys.path.insert(0, HERE)
+from core_loader import load_core, make_generator, quiet  # noqa: E402
+from gen_synthetic_save import SyntheticSave  # noqa: E402
+
+# 模块导入时即加载核心：spawn 方式（Windows/macOS）启动的子进程会重新导入本脚本，
+# 需要能按模块名找回核心里的进程池工作函数
+core = load_core()
+
+
+def parse_once(path: str, workers: int):
+    gen = make_generator(parse_workers=workers, keep_raw=True)  # keep_raw: 同时比对原文区间
+    with quiet():
+        t0 = time.perf_counter()
+        if not gen.parse_save_file(path):
+            raise RuntimeError(f'解析失败: {path}')
+        wall = time.perf_counter() - t0
+    parse_wall = next(r.wall for r in gen.metrics.stages if r.name == 'parse')
+    return wall, parse_wall, gen.timeline_events
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = ','.join(str(w) for w in sorted({1, 2, 4, 8, cpus}) if w <= max(cpus, 2))
+    parser = argparse.ArgumentParser(description='并行解析的核数扩展基准')
+    parser.add_argument('--events', type=int, default=400_000, help='合成存档事件数（默认 400000）')
+    parser.add_argument('--workers', default=default_workers, help=f'逗号分隔的进程数（默认 {default_workers}）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个进程数运行次数，取最快（默认 3）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'stellaris_bench_corpus'), help='合成存档缓存目录')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径')
+    args = parser.parse_args()
+
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    path = os.path.join(args.corpus_dir, f'bench_{args.events}_{args.seed}.txt')
+    if not os.path.exists(path):
+        print(f"🛠 生成合成存档: {path}")
+        SyntheticSave(args.events, 0, 8, 1, args.seed).write(path, False)
+    print(f"📁 {os.path.basename(path)} ({os.path.getsize(path) / 1048576:.1f} MB)，CPU 核数 {cpus}")
+
+    worker_counts = [int(w) for w in args.workers.split(',') if w.strip()]
+    _, _, reference = parse_once(path, 1)
+    ref_key = [(e.date, e.definition, e.data, e.raw_text) for e in reference]
+    del reference
+    results: Dict[str, Any] = {}
+    mismatched: List[int] = []
+    base = None
+    for w in worker_counts:
+        runs = [parse_once(path, w) for _ in range(args.repeat)]
+        same = [(e.date, e.definition, e.data, e.raw_text) for e in runs[-1][2]] == ref_key
+        best = min(r[1] for r in runs)
+        total = min(r[0] for r in runs)
+        del runs
+        base = base or (best if w == 1 else None)
+        speedup = base / best if base else None
+        results[str(w)] = {'parse_wall_s': round(best, 4), 'total_wall_s': round(total, 4), 'identical': same,
+                           'speedup': round(speedup, 2) if speedup else None,
+                           'efficiency': round(speedup / w, 2) if speedup else None}
+        if not same:
+            mismatched.append(w)
+        extra = f"  ×{speedup:.2f}  效率 {speedup / w:.0%}" if speedup else ''
+        print(f"  {'✅' if same else '❌'} {w:>2} 进程: 解析 {best:.3f}s（含读取 {total:.3f}s）{extra}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'file': os.path.basename(path), 'bytes': os.path.getsize(path), 'events': len(ref_key),
+                       'cpus': cpus, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已保存: {args.output}")
+    if mismatched:
+        print(f"\n❌ 以下进程数的解析结果与单进程不一致: {mismatched}")
+        sys.exit(1)
+    print("\n✅ 各进程数的解析结果与单进程完全一致")
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线基准测试：在不同规模的合成存档上分别计时
+
+ - 阶段: parse_save_file / generate_initial_chronicle / generate_final_chronicle /
+         generate_entities_settings_file / save_chronicle_files
+ - 指标: 墙钟（多次运行取最小值）、事件/s、阶段内峰值 RSS
+ - 结果保存为 JSON；给出 --baseline 时逐阶段对比，超出阈值即以退出码 1 失败
+
+用法:
+  python 性能测试/bench_pipeline.py --sizes 1000,5000,20000 -o bench.json
+  python 性能测试/bench_pipeline.py --baseline 性能测试/baseline.json --threshold 0.25
+  python 性能测试/bench_pipeline.py --save-baseline 性能测试/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import threading
+import contextlib
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '最新版本源码'))
+sys.path.insert(0, HERE)
+from core_loader import load_core, make_generator, quiet  # noqa: E402
+from gen_synthetic_save import SyntheticSave  # noqa: E402
+
+STAGES = ['parse', 'render', 'substitute', 'settings', 'save']
+
+
+def current_rss() -> Optional[int]:
+    """当前进程常驻内存（字节）；平台不支持时返回 None"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+        c = Counters(); c.cb = ctypes.sizeof(c)
+        psapi = ctypes.WinDLL('psapi')
+        psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(c), c.cb)
+        return c.WorkingSetSize
+    return None
+
+
+class PeakRSSSampler:
+    """后台线程按固定间隔采样 RSS，记录某段代码执行期间的峰值"""
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss() or 0)
+            self._stop.wait(self.interval)
+
+    @contextlib.contextmanager
+    def measure(self):
+        self.peak = current_rss() or 0
+        self._stop.clear()
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+        try:
+            yield self
+        finally:
+            self._stop.set(); t.join()
+            self.peak = max(self.peak, current_rss() or 0)
+
+
+def ensure_corpus(corpus_dir: str, events: int, seed: int) -> str:
+    path = os.path.join(corpus_dir, f'bench_{events}_{seed}.txt')
+    if not os.path.exists(path):
+        SyntheticSave(events, 0, 8, 1, seed).write(path, False)
+    return path
+
+
+def run_once(save_path: str, out_dir: str, seed: int) -> Dict[str, Dict[str, Any]]:
+    gen = make_generator(seed)
+    sampler = PeakRSSSampler()
+    res: Dict[str, Dict[str, Any]] = {}
+
+    def timed(stage: str, fn, *args):
+        with sampler.measure():
+            t0 = time.perf_counter()
+            value = fn(*args)
+            wall = time.perf_counter() - t0
+        res[stage] = {'wall_s': wall, 'peak_rss_mb': round(sampler.peak / 1048576, 1) if sampler.peak else None}
+        return value
+
+    with quiet():
+        if not timed('parse', gen.parse_save_file, save_path):
+            raise RuntimeError(f'解析失败: {save_path}')
+        initial = timed('render', gen.generate_initial_chronicle)
+        final = timed('substitute', gen.generate_final_chronicle, initial)
+        settings = timed('settings', gen.generate_entities_settings_file)
+        timed('save', gen.save_chronicle_files, final, settings, out_dir)
+    n = len(gen.timeline_events)
+    for stage in res.values():
+        stage['events_per_s'] = round(n / stage['wall_s'], 1) if stage['wall_s'] > 0 else None
+    res['_events'] = {'count': n}
+    return res
+
+
+def bench(sizes: List[int], repeat: int, corpus_dir: str, seed: int) -> Dict[str, Any]:
+    core = load_core()
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for events in sizes:
+            path = ensure_corpus(corpus_dir, events, seed)
+            runs = [run_once(path, out_dir, seed) for _ in range(repeat)]
+            stages = {}
+            for st in STAGES:
+                best = min(runs, key=lambda r: r[st]['wall_s'])[st]
+                peaks = [r[st]['peak_rss_mb'] for r in runs if r[st]['peak_rss_mb'] is not None]
+                stages[st] = {'wall_s': round(best['wall_s'], 6), 'events_per_s': best['events_per_s'],
+                              'peak_rss_mb': max(peaks) if peaks else None}
+            results[str(events)] = {'file_bytes': os.path.getsize(path), 'events': runs[0]['_events']['count'], 'stages': stages}
+            print(f"📊 {events:>8} 事件: " + '  '.join(f"{st} {stages[st]['wall_s']:.3f}s" for st in STAGES))
+    return {
+        'meta': {'generated_at': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'repeat': repeat, 'seed': seed, 'core_version': core.VERSION},
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float) -> List[str]:
+    """返回超出阈值的回归描述；规模或阶段不在基线中的条目跳过"""
+    regressions = []
+    for size, cur in current['results'].items():
+        base = baseline.get('results', {}).get(size)
+        if not base:
+            continue
+        for st, c in cur['stages'].items():
+            b = base['stages'].get(st)
+            if not b:
+                continue
+            limit = b['wall_s'] * (1 + threshold)
+            if c['wall_s'] > limit and c['wall_s'] - b['wall_s'] > min_delta:
+                regressions.append(f"{size} 事件 / {st}: {c['wall_s']:.3f}s > 基线 {b['wall_s']:.3f}s × {1 + threshold:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编年史生成流水线基准测试')
+    parser.add_argument('--sizes', default='1000,5000,20000', help='逗号分隔的事件数规模（默认 1000,5000,20000）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个规模运行次数，取最小墙钟（默认 3）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'stellaris_bench_corpus'), help='合成存档缓存目录')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径')
+    parser.add_argument('--baseline', help='基线 JSON；给出时逐阶段对比并在回归时以退出码 1 失败')
+    parser.add_argument('--threshold', type=float, default=0.25, help='允许的相对变慢比例（默认 0.25 即 25%%）')
+    parser.add_argument('--min-delta', type=float, default=0.01, help='忽略小于该秒数的绝对差异，避免计时噪声（默认 0.01）')
+    parser.add_argument('--save-baseline', metavar='PATH', help='把本次结果写为新的基线')
+    args = parser.parse_args()
+
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+    result = bench(sizes, args.repeat, args.corpus_dir, args.seed)
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✅ 结果已保存: {path}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print("❌ 检测到性能回归:")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print(f"✅ 与基线相比无超过 {args.threshold:.0%} 的回归")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存回归检查：在固定规模的合成存档上跑完整流水线，用 tracemalloc 记录每个阶段的峰值，
+并与预算比较，防止整份存档/编年史的多余拷贝（split 行列表、逐实体 re.sub 等）再次混入
+
+ - 临时占用 = 阶段内峰值 − 阶段结束时仍存活的内存，即不计阶段产出（事件列表、编年史文本）
+ - 预算以“本阶段处理的字符数”为单位，直接比较，不设余量；预算取实测值再留出少量空间
+ - 分块写出、分段替换等固定大小的缓冲区在小存档上会占满预算，因此规模至少 MIN_EVENTS 条事件
+ - 解析峰值：解析阶段内峰值相对阶段开始时的增长（含保留下来的事件对象）÷ 时间线块，
+   须 ≤ PARSE_PEAK_BUDGET。事件对象本身约占时间线块的 4 倍（每条约 370 字节，原文约 90 字节），
+   因此预算为 4.5 而非 1.5；整块解码、切行列表之类的拷贝会再叠加 1 倍以上，直接超出
+ - 任一检查超出预算时以退出码 1 结束，可直接接入 CI
+
+用法:
+  python 性能测试/check_memory_budget.py
+  python 性能测试/check_memory_budget.py --sizes 80000 --budget parse=0.4 -o memory.json
+"""
+
+import os
+import sys
+import json
+import tempfile
+import argparse
+import tracemalloc
+from typing import Dict, List, Any
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '最新版本源码'))
+sys.path.insert(0, HERE)
+from core_loader import make_generator, quiet  # noqa: E402
+from gen_synthetic_save import SyntheticSave  # noqa: E402
+
+# 每个阶段允许的临时占用（字节 / 本阶段处理的字符数）
+# read 通常只建立内存映射（≈0）；无法映射而退回整体解码时要持有原始字节，
+# 含中文的存档解码时还会从单字节宽度扩展为双字节再复制一次；
+# render/substitute 的产出含中文，每字符 2 字节，拼接时已完成的分段与结果各占一份；
+# settings 的产出较小，格式化各实体的临时字符串约占 3 倍，且随实体数略有增长（30 万事件时 3.14）
+DEFAULT_BUDGETS = {
+    'read': 2.5,
+    'extract': 0.1,
+    'parse': 0.5,
+    'render': 3.0,
+    'substitute': 3.0,
+    'settings': 3.5,
+    'save': 0.5,
+}
+PARSE_PEAK_BUDGET = 4.5  # 解析阶段峰值增长（含事件对象）/ 时间线块，实测约 4.1
+MIN_EVENTS = 20000     # 更小的存档上固定大小的读写缓冲区会占满预算
+
+
+def measure(path: str, out_dir: str, seed: int) -> List[Any]:
+    gen = make_generator(seed)
+    gen.metrics.track_memory = True
+    tracemalloc.start()
+    try:
+        with quiet():
+            if not gen.run_pipeline(path, out_dir):
+                raise RuntimeError(f'流水线失败: {path}')
+    finally:
+        tracemalloc.stop()
+    return gen.metrics.stages
+
+
+def parse_peak(records: List[Any]) -> Dict[str, Any]:
+    """完整解析（不过滤事件）时阶段内峰值相对阶段开始时的增长 ÷ 时间线块"""
+    st = next(r for r in records if r.name == 'parse')
+    peak = st.peak_mem - st.mem_start
+    return {'block_bytes': st.bytes, 'peak_bytes': peak, 'ratio': round(peak / max(st.bytes, 1), 3),
+            'budget': PARSE_PEAK_BUDGET, 'ok': peak <= PARSE_PEAK_BUDGET * st.bytes}
+
+
+def check(stages: List[Dict[str, Any]], budgets: Dict[str, float]) -> List[str]:
+    failures = []
+    for st in stages:
+        limit = budgets.get(st['name'])
+        transient = st['transient_mem_bytes']
+        if limit is None or transient is None or not st['bytes']:
+            continue
+        ratio = transient / st['bytes']
+        st['transient_ratio'] = round(ratio, 3)
+        st['budget'] = limit
+        st['ok'] = transient <= limit * st['bytes']
+        if not st['ok']:
+            failures.append(f"{st['label']} ({st['name']}): 临时占用 {transient / 1048576:.1f} MB = "
+                            f"{ratio:.2f} × {st['bytes'] / 1048576:.1f} MB，超出预算 {limit}")
+    return failures
+
+
+def parse_budgets(items: List[str]) -> Dict[str, float]:
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in items:
+        name, _, value = item.partition('=')
+        if name not in budgets or not value:
+            raise SystemExit(f"❌ 无效预算: {item}（格式 阶段=倍数，阶段可选 {', '.join(budgets)}）")
+        budgets[name] = float(value)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='各流水线阶段的 tracemalloc 内存预算检查')
+    parser.add_argument('--sizes', default='40000,120000', help=f'合成存档事件数，逗号分隔，至少 {MIN_EVENTS}（默认 40000,120000）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--budget', action='append', default=[], metavar='阶段=倍数', help='覆盖某阶段的预算，可重复')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径')
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+    if any(n < MIN_EVENTS for n in sizes):
+        parser.error(f"规模至少 {MIN_EVENTS} 条事件，更小的存档上固定大小的缓冲区会占满预算")
+    results, failures = {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        for events in sizes:
+            path = os.path.join(tmp, f'synthetic_{events}.txt')
+            SyntheticSave(events, 0, 8, 1, args.seed).write(path, False)
+            records = measure(path, os.path.join(tmp, f'out_{events}'), args.seed)
+            stages = [r.to_dict() for r in records]
+            bad = check(stages, budgets)
+            failures += [f"{events} 事件 / {b}" for b in bad]
+            peak = parse_peak(records)
+            if not peak['ok']:
+                failures.append(f"{events} 事件 / 解析峰值 {peak['peak_bytes'] / 1048576:.1f} MB = {peak['ratio']:.2f} × "
+                                f"时间线块，超出预算 {PARSE_PEAK_BUDGET}")
+            results[str(events)] = {'stages': stages, 'parse_peak': peak}
+            print(f"\n📁 {events} 事件 ({os.path.getsize(path) / 1048576:.1f} MB)")
+            for st in stages:
+                if st.get('transient_ratio') is None:
+                    continue
+                print(f"  {'✅' if st['ok'] else '❌'} {st['label']:<6} 峰值 {st['peak_mem_bytes'] / 1048576:7.1f} MB  "
+                      f"临时 {st['transient_mem_bytes'] / 1048576:6.1f} MB  = {st['transient_ratio']:.2f}× / 预算 {st['budget']}×")
+            print(f"  {'✅' if peak['ok'] else '❌'} 解析峰值 {peak['peak_bytes'] / 1048576:.1f} MB  "
+                  f"= {peak['ratio']:.2f}× 时间线块 / 预算 {PARSE_PEAK_BUDGET}×")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'budgets': budgets, 'parse_peak_budget': PARSE_PEAK_BUDGET, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已保存: {args.output}")
+    if failures:
+        print("\n❌ 超出内存预算:")
+        for f in failures:
+            print(f"  - {f}")
+        sys.exit(1)
+    print("\n✅ 所有阶段均在内存预算内")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出一致性检查：在合成存档上跑完整流水线，核对各输出文件之间的对应关系，以及存档名称的显示规则
+
+ - countries: --country all 时每个国家的 生成统计.json 只含共享的读取/定位/解析阶段与本国自己的
+   渲染/替换/设定/保存阶段，各一条；渲染的事件数与本国时间线一致，合计耗时等于所列阶段之和
+ - shards: --chapters 同时按世纪 / 每 N 条事件分片时，每个章标题都与本章第一条事件在同一分片、
+   位于其前；索引中每个年份指向的分片行与完整编年史中的行都是该年的第一条事件
+ - names: 存档中的国家名称按键的形态判断能否显示：玩家自己起的名字（含 _ 或 % 也一样）原样显示，
+   NAME_ 键取其后的名称，EMPIRE_DESIGN_/PRESCRIPTED_ 键与 %…% 模板视为无法显示
+ - 任一检查失败时以退出码 1 结束
+
+用法:
+  python 性能测试/check_outputs.py
+  python 性能测试/check_outputs.py --events 20000 --checks countries
+"""
+
+import os
+import re
+import sys
+import json
+import tempfile
+import argparse
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '最新版本源码'))
+sys.path.insert(0, HERE)
+from core_loader import load_core, make_generator, quiet  # noqa: E402
+from gen_synthetic_save import SyntheticSave  # noqa: E402
+
+SHARED_STAGES = ['read', 'extract', 'parse']
+COUNTRY_STAGES = ['render', 'substitute', 'settings', 'save']
+SHARD_MODES = ['century', 500]
+# 国家名称键 → 期望显示的名称（None 为本地化键，无法直接显示）
+COUNTRY_NAMES = {
+    'Terran_Union': 'Terran_Union', 'X%Y': 'X%Y', '100% Pure': '100% Pure', '联合_星域': '联合_星域',
+    'NAME_United_Nations': 'United Nations', 'EMPIRE_DESIGN_humans1': None,
+    'PRESCRIPTED_name_humans1': None, '%ADJECTIVE% Star Empire': None,
+}
+HEADING_RE = re.compile(r'^【第\d+章】')
+
+
+def check_countries(core, tmp: str, events: int, seed: int) -> List[str]:
+    path = os.path.join(tmp, 'countries.txt')
+    SyntheticSave(events, 0, 4, 2, seed).write(path, False)
+    out = os.path.join(tmp, 'out_countries')
+    gen = make_generator(seed, country=core.StellarisChronicleGenerator.ALL_COUNTRIES)
+    with quiet():
+        if not gen.run_pipeline(path, out):
+            return ['流水线失败']
+    problems = []
+    timelines = gen.country_timelines
+    if len(timelines) < 2:
+        return [f'合成存档只解析出 {len(timelines)} 条时间线']
+    for tl in timelines:
+        with open(os.path.join(out, f'国家_{tl.country}', '生成统计.json'), encoding='utf-8') as f:
+            data = json.load(f)
+        names = [st['name'] for st in data['stages']]
+        shared = [n for n in names if n in SHARED_STAGES]
+        if names[len(shared):] != COUNTRY_STAGES:
+            problems.append(f"国家 {tl.country}: 阶段记录为 {names}，应为共享阶段 + {COUNTRY_STAGES}")
+        render = next((st for st in data['stages'] if st['name'] == 'render'), None)
+        if render is not None and render['events'] != len(tl.events):
+            problems.append(f"国家 {tl.country}: 渲染阶段记录 {render['events']} 条，时间线有 {len(tl.events)} 条")
+        total = sum(st['wall_s'] for st in data['stages'])
+        if abs(total - data['total_wall_s']) > 1e-3:
+            problems.append(f"国家 {tl.country}: 合计耗时 {data['total_wall_s']}s 与各阶段之和 {total:.6f}s 不符")
+    return problems
+
+
+def read_lines(path: str) -> List[str]:
+    with open(path, encoding='utf-8') as f:
+        return f.read().split('\n')
+
+
+def check_shards(core, tmp: str, events: int, seed: int) -> List[str]:
+    path = os.path.join(tmp, 'shards.txt')
+    SyntheticSave(events, 0, 4, 1, seed).write(path, False)
+    problems = []
+    for mode in SHARD_MODES:
+        out = os.path.join(tmp, f'out_shards_{mode}')
+        gen = make_generator(seed, chapters=True, sharding=mode)
+        with quiet():
+            if not gen.run_pipeline(path, out):
+                return [f'{mode}: 流水线失败']
+        folder = os.path.join(out, core.StellarisChronicleGenerator.SHARD_DIR)
+        with open(os.path.join(folder, core.StellarisChronicleGenerator.SHARD_INDEX), encoding='utf-8') as f:
+            index = json.load(f)
+        full = read_lines(os.path.join(out, '群星帝国编年史.txt'))
+        files = {sh['file']: read_lines(os.path.join(folder, sh['file'])) for sh in index['shards']}
+        headings = 0
+        for name, lines in files.items():
+            for j, line in enumerate(lines):
+                if not HEADING_RE.match(line):
+                    continue
+                headings += 1
+                # 标题之后隔一空行即本章第一条事件
+                if j + 2 >= len(lines) or not re.match(r'\d+\.', lines[j + 2]):
+                    problems.append(f"{mode}: {name} 第 {j + 1} 行的章标题与本章第一条事件不在同一分片")
+        if headings != len(gen.eras):
+            problems.append(f"{mode}: 分片中共有 {headings} 个章标题，应为 {len(gen.eras)} 个")
+        if len(gen.eras) < 2:
+            problems.append(f"{mode}: 只分出 {len(gen.eras)} 章，无法检查章标题的位置（加大 --events）")
+        first_line = {}
+        for n, line in enumerate(full):
+            y = line.partition('.')[0]
+            if y.isdigit() and line[len(y) + 1:len(y) + 3].isdigit():
+                first_line.setdefault(y, n + 1)
+        for y, e in index['years'].items():
+            if e['chronicle_line'] != first_line.get(y) or files[e['file']][e['line'] - 1] != full[e['chronicle_line'] - 1]:
+                problems.append(f"{mode}: 索引中 {y} 年指向 {e['file']} 第 {e['line']} 行，与完整编年史不符")
+                break
+    return problems
+
+
+def check_names(core, tmp: str, events: int, seed: int) -> List[str]:
+    path = os.path.join(tmp, 'names.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('country={\n')
+        for cid, key in enumerate(COUNTRY_NAMES):
+            f.write(f'\t{cid}={{\n\t\tname={{\n\t\t\tkey="{key}"\n\t\t}}\n\t}}\n')
+        f.write('}\n')
+    index = core.SaveIndex(path)
+    try:
+        return [f"国家名称 {key!r} 显示为 {index.country(str(cid)).name!r}，应为 {want!r}"
+                for cid, (key, want) in enumerate(COUNTRY_NAMES.items()) if index.country(str(cid)).name != want]
+    finally:
+        index.close()
+
+
+CHECKS: Dict[str, Callable] = {
+    'countries': check_countries,
+    'shards': check_shards,
+    'names': check_names,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流水线输出文件之间的一致性检查')
+    parser.add_argument('--events', type=int, default=5000, help='合成存档事件数（默认 5000）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--checks', default=','.join(CHECKS), help=f"运行的检查，逗号分隔（默认 {','.join(CHECKS)}）")
+    args = parser.parse_args()
+
+    wanted = [c.strip() for c in args.checks.split(',') if c.strip()]
+    unknown = [c for c in wanted if c not in CHECKS]
+    if unknown:
+        parser.error(f"未知检查: {', '.join(unknown)}（可选 {', '.join(CHECKS)}）")
+    core = load_core()
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in wanted:
+            problems = CHECKS[name](core, tmp, args.events, args.seed)
+            print(f"  {'❌' if problems else '✅'} {name}")
+            for p in problems:
+                print(f"      - {p}")
+            failures += [f"{name}: {p}" for p in problems]
+    if failures:
+        print(f"\n❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("\n✅ 所有输出一致性检查通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间线分析（最新版本源码/timeline_analytics.py）的已知结果检查：在手写的小时间线上核对各聚合的精确结果
+
+ - 导入模块本身不加载 GUI 核心，第一次换算日期时才加载
+ - density / rolling_activity / war_gaps / first_occurrence / summarize 与手算结果一致，日期无法识别的事件不计入
+ - numbers 的 CSR 存放、数值引用的 ref_kind / ref_id；引用键超过 127 种时 ref_kind 不溢出，.npz 往返后不变
+ - 任一检查失败时以退出码 1 结束；需要 numpy
+
+用法:
+  python 性能测试/check_timeline_analytics.py
+"""
+
+import os
+import sys
+import tempfile
+from typing import Any, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '最新版本源码'))
+import core_loader  # noqa: E402
+import timeline_analytics as ta_mod  # noqa: E402
+
+# (日期, 事件代码, data)；宣战间隔按每年 360 天、每月 30 天手算
+EVENTS = [
+    ('2200.01.01', 'timeline_origin', {}),
+    ('2200.03.01', 'timeline_war_declared', {'planet': '5'}),
+    ('2201.03.01', 'timeline_war_declared', {}),              # 距上次宣战 360 天
+    ('2201.03.01', 'timeline_first_war_declared', {}),        # 同一天，间隔 0
+    ('2203.06.16', 'timeline_colony', {'numbers': [1, 2]}),
+    ('2215.01.01', 'timeline_war_declared_attacker', {}),     # 14 年 − 2 个月 = 4980 天
+    ('x', 'timeline_broken', {}),                             # 日期无法识别，不计入任何聚合
+]
+EXPECTED = {
+    'density_10': ([2200, 2210], [5, 1]),
+    'density_1': (list(range(2200, 2216)), [2, 2, 0, 1] + [0] * 11 + [1]),
+    'rolling_3': [2, 4, 4, 3, 1, 1] + [0] * 9 + [1],
+    'war_gaps': [360, 0, 4980],
+    'first_occurrence': {'timeline_origin': '2200.01.01', 'timeline_war_declared': '2200.03.01',
+                         'timeline_first_war_declared': '2201.03.01', 'timeline_colony': '2203.06.16',
+                         'timeline_war_declared_attacker': '2215.01.01'},
+    'summary': {'events': 7, 'first_date': '2200.01.01', 'last_date': '2215.01.01', 'busiest_decade': 2200,
+                'busiest_decade_events': 5, 'wars': 4, 'median_war_gap_days': 360.0},
+    'numbers_offsets': [0, 0, 0, 0, 0, 2, 2, 2],
+    'numbers_values': [1, 2],
+    'ref': ([-1, 0, -1, -1, -1, -1, -1], [-1, 5, -1, -1, -1, -1, -1], ['planet']),
+}
+MANY_KINDS = 300
+
+
+def expect(problems: List[str], name: str, got: Any, want: Any):
+    got = got.tolist() if hasattr(got, 'tolist') else got
+    if got != want:
+        problems.append(f"{name}: 得到 {got}，应为 {want}")
+
+
+def main():
+    problems: List[str] = []
+    if core_loader.MODULE_NAME in sys.modules:
+        problems.append('导入 timeline_analytics 时就加载了 GUI 核心')
+    if ta_mod.np is None:
+        print('❌ 时间线分析需要 numpy，请先安装依赖: pip install -r requirements.txt')
+        sys.exit(1)
+    core = core_loader.load_core()
+    ta = ta_mod.TimelineArrays.from_events([core.TimelineEvent(d, df, data) for d, df, data in EVENTS])
+
+    years, counts = ta_mod.density(ta, 10)
+    expect(problems, 'density(10)', (years.tolist(), counts.tolist()), EXPECTED['density_10'])
+    years, counts = ta_mod.density(ta, 1)
+    expect(problems, 'density(1)', (years.tolist(), counts.tolist()), EXPECTED['density_1'])
+    expect(problems, 'rolling_activity(3)', ta_mod.rolling_activity(ta, 3)[1], EXPECTED['rolling_3'])
+    expect(problems, 'war_gaps', ta_mod.war_gaps(ta), EXPECTED['war_gaps'])
+    expect(problems, 'first_occurrence', list(ta_mod.first_occurrence(ta).items()),
+           list(EXPECTED['first_occurrence'].items()))
+    summary = ta_mod.summarize(ta)
+    expect(problems, 'summarize', {k: summary[k] for k in EXPECTED['summary']}, EXPECTED['summary'])
+    expect(problems, 'numbers_offsets', ta.numbers_offsets, EXPECTED['numbers_offsets'])
+    expect(problems, 'numbers_values', ta.numbers_values, EXPECTED['numbers_values'])
+    expect(problems, 'ref', (ta.ref_kind.tolist(), ta.ref_id.tolist(), ta.ref_kinds), EXPECTED['ref'])
+
+    # 每个事件引用一种不同的键：ref_kind 需要超出 int8 的范围
+    many = ta_mod.TimelineArrays.from_events(
+        [core.TimelineEvent('2200.01.01', 'timeline_ref', {f'key{i}': str(i)}) for i in range(MANY_KINDS)])
+    expect(problems, f'{MANY_KINDS} 种引用键的 ref_kind', many.ref_kind, list(range(MANY_KINDS)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'many.npz')
+        ta_mod.save_npz(path, many)
+        back = ta_mod.load_npz(path)
+    expect(problems, '.npz 往返后的 ref_kind', back.ref_kind, list(range(MANY_KINDS)))
+    expect(problems, '.npz 往返后的 ref_kinds', back.ref_kinds, many.ref_kinds)
+
+    for p in problems:
+        print(f"  ❌ {p}")
+    if problems:
+        print(f"\n❌ {len(problems)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 时间线分析的各项聚合与已知结果一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨版本对比：在同一批存档上分别运行 历史版本/0.02、0.03 与当前内嵌核心
+
+ - 性能: 解析吞吐（MB/s、事件/s，多次取最快）、解析阶段 tracemalloc 峰值
+ - 兼容性: 解析出的事件序列 (date, definition, data) 是否一致；
+           生成的编年史在屏蔽随机名称（AI 帝国/种族名、随机星球名）后逐行比对
+ - .sav（zip）先把其中的 gamestate 解压到临时目录再对比，各版本读到的是同一份文本
+ - 解析出的事件与参照版本不一致时以退出码 1 结束，便于在更换解析引擎后回归；
+   编年史差异默认只报告（新版本会补充事件描述），加 --strict 时同样视为失败
+
+用法:
+  python 性能测试/compare_versions.py 存档1.sav 存档2.txt
+  python 性能测试/compare_versions.py --sizes 2000,20000 --versions 0.03,current
+  python 性能测试/compare_versions.py --sizes 5000 --reference 0.03 -o compare.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import random
+import difflib
+import tempfile
+import argparse
+import zipfile
+import tracemalloc
+import importlib.util
+from typing import Dict, List, Any, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, os.path.join(ROOT, '最新版本源码'))
+sys.path.insert(0, HERE)
+from core_loader import load_core, quiet  # noqa: E402
+from gen_synthetic_save import SyntheticSave  # noqa: E402
+
+HISTORY = {
+    '0.02': os.path.join(ROOT, '历史版本', '0.02', 'stellaris_chronicle_generator_v0.02.py'),
+    '0.03': os.path.join(ROOT, '历史版本', '0.03', 'stellaris_chronicle_generator_v0.03.py'),
+}
+ENTITY_MASK = '<实体>'
+PLANET_MASK = '<星球>'
+PLAYER_MASK = '<玩家帝国>'
+
+
+def load_version(version: str):
+    """按版本号加载生成器模块；历史版本使用独立模块名，互不覆盖"""
+    if version == 'current':
+        return load_core()
+    path = HISTORY[version]
+    name = 'stellaris_chronicle_v' + version.replace('.', '_')
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    with quiet():
+        spec.loader.exec_module(module)
+    return module
+
+
+def new_generator(module, seed: int):
+    random.seed(seed)
+    with quiet():
+        return module.StellarisChronicleGenerator()
+
+
+def extract_gamestate(path: str, tmp: str) -> str:
+    """.sav 为 zip 包：解压其中的 gamestate 到临时目录（保留原文件名便于在报告中辨认）；其他文件原样返回"""
+    if not zipfile.is_zipfile(path):
+        return path
+    with zipfile.ZipFile(path) as zf:
+        if 'gamestate' not in zf.namelist():
+            raise SystemExit(f"❌ {path} 中没有 gamestate")
+        folder = tempfile.mkdtemp(dir=tmp)
+        out = os.path.join(folder, os.path.basename(path))
+        with zf.open('gamestate') as src, open(out, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    return out
+
+
+def event_key(ev) -> Tuple[str, str, str]:
+    return (ev.date, ev.definition, json.dumps(ev.data, ensure_ascii=False, sort_keys=True))
+
+
+def measure_parse(module, path: str, repeat: int, seed: int) -> Dict[str, Any]:
+    """多次解析取最快墙钟；另跑一次 tracemalloc 记录峰值，避免追踪开销计入耗时"""
+    size = os.path.getsize(path)
+    best, gen = None, None
+    for _ in range(repeat):
+        gen = new_generator(module, seed)
+        with quiet():
+            t0 = time.perf_counter()
+            ok = gen.parse_save_file(path)
+            wall = time.perf_counter() - t0
+        if not ok:
+            raise RuntimeError(f'解析失败: {path}')
+        best = wall if best is None else min(best, wall)
+    n = len(gen.timeline_events)
+    probe = new_generator(module, seed)
+    tracemalloc.start()
+    try:
+        with quiet():
+            probe.parse_save_file(path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del probe
+    return {
+        'wall_s': round(best, 6), 'events': n,
+        'mb_per_s': round(size / 1048576 / best, 2) if best > 0 else None,
+        'events_per_s': round(n / best, 1) if best > 0 else None,
+        'peak_mem_mb': round(peak / 1048576, 2),
+        '_events': [event_key(e) for e in gen.timeline_events],
+    }
+
+
+def masked_chronicle(module, path: str, seed: int) -> List[str]:
+    """完整生成编年史，并把随机生成的名称替换为固定标记"""
+    gen = new_generator(module, seed)
+    with quiet():
+        gen.parse_save_file(path)
+        final = gen.generate_final_chronicle(gen.generate_initial_chronicle())
+    masks = [(e.name, ENTITY_MASK) for e in gen.generated_entities.values()]
+    masks += [(p, PLANET_MASK) for p in getattr(gen, 'planet_names', [])]
+    masks.append((gen.player_empire_name, PLAYER_MASK))
+    # 长名称优先，避免短名称截断长名称
+    table = {name: mark for name, mark in sorted(masks, key=lambda m: -len(m[0])) if name}
+    if table:
+        pattern = re.compile('|'.join(re.escape(n) for n in sorted(table, key=len, reverse=True)))
+        final = pattern.sub(lambda m: table[m.group(0)], final)
+    return final.splitlines()
+
+
+def diff_summary(ref: List[str], cur: List[str], examples: int) -> Dict[str, Any]:
+    changed, samples = 0, []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, ref, cur, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        changed += max(i2 - i1, j2 - j1)
+        if len(samples) < examples:
+            samples.append({'ref': ref[i1:i2][:3], 'cur': cur[j1:j2][:3]})
+    return {'identical': changed == 0, 'changed_lines': changed, 'examples': samples}
+
+
+def compare_corpus(paths: List[str], versions: List[str], reference: str, repeat: int,
+                   seed: int, examples: int) -> Dict[str, Any]:
+    modules = {v: load_version(v) for v in versions}
+    report: Dict[str, Any] = {}
+    for path in paths:
+        print(f"\n📁 {os.path.basename(path)} ({os.path.getsize(path) / 1048576:.1f} MB)")
+        parsed = {v: measure_parse(modules[v], path, repeat, seed) for v in versions}
+        chronicles = {v: masked_chronicle(modules[v], path, seed) for v in versions}
+        ref_events = parsed[reference]['_events']
+        entry = {}
+        for v in versions:
+            p = parsed[v]
+            events = p.pop('_events')
+            same_events = events == ref_events
+            chron = diff_summary(chronicles[reference], chronicles[v], examples)
+            speedup = parsed[reference]['wall_s'] / p['wall_s'] if p['wall_s'] else None
+            entry[v] = dict(p, events_match=same_events, chronicle=chron,
+                            speedup_vs_ref=round(speedup, 2) if speedup else None)
+            mark = '✅' if same_events and chron['identical'] else '⚠️'
+            print(f"  {mark} {v:>7}: 解析 {p['wall_s']:.3f}s  {p['mb_per_s']} MB/s  {p['events_per_s']} 事件/s  "
+                  f"峰值 {p['peak_mem_mb']} MB  ×{entry[v]['speedup_vs_ref']}  "
+                  f"事件{'一致' if same_events else '不一致'}  编年史差异 {chron['changed_lines']} 行")
+            for ex in chron['examples']:
+                print(f"        - {reference}: {ex['ref']}\n          {v}: {ex['cur']}")
+        report[os.path.basename(path)] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='历史版本与当前核心的解析性能及输出兼容性对比')
+    parser.add_argument('saves', nargs='*', help='存档文件（.sav 或已解压的 gamestate）')
+    parser.add_argument('--sizes', default='', help='额外生成的合成存档事件数，逗号分隔（未给存档时默认 2000,20000）')
+    parser.add_argument('--versions', default='0.02,0.03,current', help='参与对比的版本（默认 0.02,0.03,current）')
+    parser.add_argument('--reference', default='0.03', help='作为兼容性参照的版本（默认 0.03）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个版本解析次数，取最快（默认 3）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--examples', type=int, default=3, help='每个版本最多展示的差异片段数')
+    parser.add_argument('--strict', action='store_true', help='编年史文本存在差异时也以退出码 1 失败')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径')
+    args = parser.parse_args()
+
+    versions = [v.strip() for v in args.versions.split(',') if v.strip()]
+    unknown = [v for v in versions + [args.reference] if v != 'current' and v not in HISTORY]
+    if unknown:
+        parser.error(f"未知版本: {', '.join(unknown)}（可选 {', '.join(HISTORY)}, current）")
+    if args.reference not in versions:
+        versions.insert(0, args.reference)
+
+    sizes = args.sizes or ('' if args.saves else '2000,20000')
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [extract_gamestate(p, tmp) for p in args.saves]
+        for events in (int(x) for x in sizes.split(',') if x.strip()):
+            path = os.path.join(tmp, f'synthetic_{events}_{args.seed}.txt')
+            SyntheticSave(events, 0, 8, 1, args.seed).write(path, False)
+            paths.append(path)
+        report = compare_corpus(paths, versions, args.reference, args.repeat, args.seed, args.examples)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'reference': args.reference, 'versions': versions, 'seed': args.seed, 'results': report},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已保存: {args.output}")
+    mismatched = [f"{name} / {v}" for name, entry in report.items() for v, r in entry.items()
+                  if not r['events_match'] or (args.strict and not r['chronicle']['identical'])]
+    if mismatched:
+        print("\n❌ 与参照版本存在差异: " + ', '.join(mismatched))
+        sys.exit(1)
+    print(f"\n✅ 所有版本解析出的事件均与 {args.reference} 一致")
+
+
+if __name__ == '__main__':
+    main()
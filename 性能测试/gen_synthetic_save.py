@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成 Clausewitz 格式的 gamestate，用于复现大存档的性能问题
+
+ - timeline_events 的事件代码取自核心的 event_descriptions，频率近似真实战役：
+   起源 1 次、每年 1 个年度标记、"首次"里程碑至多 1 次、其余常规事件按 Zipf 分布
+ - data 覆盖三种形态：纯数字 (0 39)、下标条目 (0="..." 1="...")、键值对 (planet="12")
+ - 事件中偶尔带嵌套块；时间线前后是体量可调的无关大段（pop、market 等）
+ - planets / galactic_object / country / leaders / fleet / ships 段的 id 与事件 data 对应
+ - 可选打包为 .sav（zip，内含 gamestate 与 meta）
+
+用法:
+  python 性能测试/gen_synthetic_save.py -o corpus/100k.txt --events 100000
+  python 性能测试/gen_synthetic_save.py -o corpus/500mb.sav --events 200000 --size 500 --sav
+"""
+
+import os
+import sys
+import string
+import random
+import zipfile
+import argparse
+from typing import Dict, List, Tuple, Any, Iterator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '最新版本源码'))
+from core_loader import make_generator  # noqa: E402
+
+START_YEAR = 2200
+MAX_YEARS = 7799  # 日期保持 4 位年份，字符串排序才与时间顺序一致
+
+# 模板字段 → 事件 data 中承载实体 id 的键
+LOCATION_KEYS = {
+    'planet_name': 'planet', 'colony_name': 'planet', 'new_capital': 'planet',
+    'system_name': 'system', 'location': 'system',
+    'leader_name': 'leader', 'fleet_name': 'fleet', 'ship_name': 'ship',
+}
+LEVIATHAN_CODES = [39, 134217816, 52, 77, 201]  # 前两个为已收录代码，其余用于覆盖“未知星神兽”
+ETHICS = ['ethic_xenophobe', 'ethic_xenophile', 'ethic_materialist', 'ethic_spiritualist',
+          'ethic_authoritarian', 'ethic_egalitarian', 'ethic_militarist', 'ethic_pacifist']
+AUTHORITIES = ['auth_democratic', 'auth_oligarchic', 'auth_dictatorial', 'auth_imperial']
+
+
+class SyntheticSave:
+    def __init__(self, events: int, size_mb: float, countries: int, timelines: int, seed: int):
+        gen = make_generator()
+        self.rng = random.Random(seed)
+        self.n_events = events
+        self.target_bytes = int(size_mb * 1024 * 1024)
+        self.n_countries = max(countries, timelines, 2)
+        self.n_timelines = max(timelines, 1)
+        self.names = gen.planet_names
+        self.empire_names = [n for names in gen.empire_generation_data['name_lists'].values() for n in names]
+        self.n_planets = max(200, events // 20)
+        self.n_systems = max(100, events // 40)
+        self.n_leaders = max(50, events // 100)
+        self.n_fleets = max(50, events // 100)
+        self._classify(gen.event_descriptions)
+
+    # ---- 事件代码分类与频率 ----
+    def _classify(self, descriptions: Dict[str, str]):
+        fmt = string.Formatter()
+        self.fields: Dict[str, List[str]] = {}
+        self.origins, self.firsts, self.recurring = [], [], []
+        for code, template in descriptions.items():
+            self.fields[code] = [f for _, f, _, _ in fmt.parse(template) if f]
+            if code == 'timeline_event_year':
+                continue
+            if code.startswith('timeline_origin_'):
+                self.origins.append(code)
+            elif code.startswith('timeline_first_') or code in ('timeline_galactic_community_formed', 'timeline_great_khan',
+                                                                'timeline_become_the_crisis', 'timeline_synthetic_evolution',
+                                                                'timeline_modularity'):
+                self.firsts.append(code)
+            else:
+                self.recurring.append(code)
+            if '[帝国' in template or '[堕落帝国' in template:
+                self.fields[code].append('_empire')
+        self.recurring += [f'timeline_synthetic_unknown_{i}' for i in range(3)]  # 覆盖“未收录事件代码”路径
+        self.rng.shuffle(self.recurring)
+        self.zipf_weights = [1.0 / (rank + 1) ** 1.1 for rank in range(len(self.recurring))]
+
+    def _timeline(self, country_id: int) -> List[Tuple[str, str, Any]]:
+        """生成一个国家按日期排序的 (date, definition, data) 列表"""
+        n = self.n_events if country_id == 0 else max(10, self.n_events // 10)
+        years = min(max(10, n // 8), MAX_YEARS)
+        firsts = self.rng.sample(self.firsts, min(len(self.firsts), max(0, n - years - 1) // 4))
+        rest = max(0, n - years - len(firsts))
+        recurring = self.rng.choices(self.recurring, self.zipf_weights, k=rest)
+        dated = [(self._date(0, 1, 1), self.rng.choice(self.origins))]
+        dated += [(self._date(y, 1, 1), 'timeline_event_year') for y in range(1, years)]
+        # "首次"里程碑集中在前期，常规事件均匀分布
+        dated += [(self._date(int(self.rng.triangular(0, years, 0)), self.rng.randint(1, 12), self.rng.randint(1, 30)), c) for c in firsts]
+        dated += [(self._date(self.rng.randrange(years), self.rng.randint(1, 12), self.rng.randint(1, 30)), c) for c in recurring]
+        dated.sort(key=lambda x: x[0])
+        return [(d, c, self._data_for(c, country_id)) for d, c in dated]
+
+    @staticmethod
+    def _date(year_offset: int, month: int, day: int) -> str:
+        return f"{START_YEAR + year_offset}.{month:02d}.{day:02d}"
+
+    def _data_for(self, code: str, country_id: int):
+        fields = self.fields.get(code, [])
+        if 'leviathan_name' in fields:
+            return ('numbers', [0, self.rng.choice(LEVIATHAN_CODES)])
+        if '_empire' in fields:
+            other = self.rng.choice([c for c in range(self.n_countries) if c != country_id])
+            return ('numbers', [0, other])
+        kv = {}
+        for f in fields:
+            key = LOCATION_KEYS.get(f)
+            if key:
+                kv[key] = str(self._entity_id(key))
+        if kv:
+            return ('kv', kv)
+        if code == 'timeline_galactic_community_resolution':
+            return ('items', [f"resolution_{self.rng.choice(['ecology', 'commerce', 'defense', 'rights'])}_{i}" for i in range(self.rng.randint(1, 3))])
+        return None
+
+    def _entity_id(self, key: str) -> int:
+        limit = {'planet': self.n_planets, 'system': self.n_systems, 'leader': self.n_leaders,
+                 'fleet': self.n_fleets, 'ship': self.n_fleets * 4}[key]
+        return self.rng.randrange(limit)
+
+    # ---- 输出 ----
+    def _event_lines(self, date: str, code: str, data) -> Iterator[str]:
+        yield '\t\t\t{'
+        yield f'\t\t\t\tdate="{date}"'
+        yield f'\t\t\t\tdefinition="{code}"'
+        if data:
+            shape, value = data
+            yield '\t\t\t\tdata={'
+            if shape == 'numbers':
+                yield '\t\t\t\t\t' + ' '.join(str(v) for v in value)
+            elif shape == 'items':
+                for i, v in enumerate(value):
+                    yield f'\t\t\t\t\t{i}="{v}"'
+            else:
+                for k, v in value.items():
+                    yield f'\t\t\t\t\t{k}="{v}"'
+            yield '\t\t\t\t}'
+        if self.rng.random() < 0.05:
+            yield '\t\t\t\tcontext={'
+            yield f'\t\t\t\t\tsource={{ type=country id={self.rng.randrange(self.n_countries)} }}'
+            yield '\t\t\t\t\tflags={ "seen" "logged" }'
+            yield '\t\t\t\t}'
+        yield '\t\t\t}'
+
+    def _named_section(self, name: str, count: int, names: List[str], extra) -> Iterator[str]:
+        yield f'{name}={{'
+        for i in range(count):
+            yield f'\t{i}={{'
+            yield '\t\tname={'
+            yield f'\t\t\tkey="{self.rng.choice(names)}{"" if i < len(names) else f" {i}"}"'
+            yield '\t\t}'
+            yield from extra(i)
+            yield '\t}'
+        yield '}'
+
+    def _filler(self, name: str, target: int) -> Iterator[str]:
+        """与时间线无关的大段，按字节数填充"""
+        yield f'{name}={{'
+        written = 0; i = 0
+        while written < target:
+            entry = (f'\t{i}={{\n\t\tspecies={self.rng.randrange(50)}\n\t\tplanet={self.rng.randrange(self.n_planets)}\n'
+                     f'\t\tethos={{\n\t\t\tethic="{self.rng.choice(ETHICS)}"\n\t\t}}\n'
+                     f'\t\tresources={{ energy={self.rng.random() * 100:.3f} minerals={self.rng.random() * 100:.3f} }}\n'
+                     f'\t\tflags={{ worked_job={self.rng.randrange(100000)} happiness={self.rng.random():.5f} }}\n\t}}')
+            written += len(entry) + 1; i += 1
+            yield entry
+        yield '}'
+
+    def _country_section(self) -> Iterator[str]:
+        yield 'country={'
+        for cid in range(self.n_countries):
+            yield f'\t{cid}={{'
+            yield '\t\tname={'
+            yield f'\t\t\tkey="{self.empire_names[cid % len(self.empire_names)]}"'
+            yield '\t\t}'
+            yield '\t\tethos={'
+            for ethic in self.rng.sample(ETHICS, 3):
+                yield f'\t\t\tethic="{ethic}"'
+            yield '\t\t}'
+            yield '\t\tgovernment={'
+            yield f'\t\t\tauthority="{self.rng.choice(AUTHORITIES)}"'
+            yield '\t\t}'
+            yield f'\t\tcapital={self.rng.randrange(self.n_planets)}'
+            if cid < self.n_timelines:
+                yield '\t\ttimeline_events={'
+                for date, code, data in self._timeline(cid):
+                    yield from self._event_lines(date, code, data)
+                yield '\t\t}'
+            yield '\t}'
+        yield '}'
+
+    def lines(self, filler_bytes: int) -> Iterator[str]:
+        rng = self.rng
+        yield 'version="Synthetic v3.14.1"'
+        yield 'version_control_revision=0'
+        yield 'name="合成测试存档"'
+        yield f'date="{START_YEAR + 200}.01.01"'
+        yield 'player={\n\t{\n\t\tname="player"\n\t\tcountry=0\n\t}\n}'
+        yield from self._named_section('galactic_object', self.n_systems, self.names,
+                                       lambda i: [f'\t\tcoordinate={{ x={rng.uniform(-500, 500):.2f} y={rng.uniform(-500, 500):.2f} }}'])
+        yield 'planets={'
+        for line in self._named_section('planet', self.n_planets, self.names,
+                                        lambda i: [f'\t\tplanet_class="pc_{rng.choice(["desert", "ocean", "tundra", "gaia"])}"',
+                                                   f'\t\tcoordinate={{ origin={i % self.n_systems} }}']):
+            yield '\t' + line
+        yield '}'
+        yield from self._filler('pop', filler_bytes // 2)
+        yield from self._country_section()
+        yield from self._named_section('leaders', self.n_leaders, ['伊莱恩', '卡森', '瑟琳娜', '诺瓦', '奥里昂', '塔林'],
+                                       lambda i: [f'\t\tclass="{rng.choice(["admiral", "scientist", "governor"])}"', f'\t\tlevel={rng.randint(1, 10)}'])
+        yield from self._named_section('fleet', self.n_fleets, ['第一舰队', '远征舰队', '守望舰队', '先锋舰队'],
+                                       lambda i: [f'\t\tships={{ {i * 4} {i * 4 + 1} {i * 4 + 2} {i * 4 + 3} }}'])
+        yield from self._named_section('ships', self.n_fleets * 4, ['开拓者号', '黎明号', '不屈号', '远航者号', '星火号'],
+                                       lambda i: [f'\t\tfleet={i // 4}'])
+        yield from self._filler('market', filler_bytes - filler_bytes // 2)
+
+    def write(self, path: str, as_sav: bool):
+        # 先按无填充体量估算结构部分大小，再用填充段补足目标体量
+        base = sum(len(line.encode('utf-8')) + 1 for line in SyntheticSave._reseeded(self).lines(0))
+        filler = max(0, self.target_bytes - base)
+        if as_sav:
+            with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('meta', f'version="Synthetic v3.14.1"\nname="合成测试存档"\ndate="{START_YEAR + 200}.01.01"\n')
+                with zf.open('gamestate', 'w', force_zip64=True) as raw:
+                    self._write_lines(raw, filler)
+        else:
+            with open(path, 'wb') as raw:
+                self._write_lines(raw, filler)
+
+    def _write_lines(self, raw, filler: int):
+        buf: List[str] = []; size = 0
+        for line in self.lines(filler):
+            buf.append(line); size += len(line)
+            if size > 1 << 20:
+                raw.write(('\n'.join(buf) + '\n').encode('utf-8')); buf = []; size = 0
+        raw.write(('\n'.join(buf) + '\n').encode('utf-8'))
+
+    @staticmethod
+    def _reseeded(save: 'SyntheticSave') -> 'SyntheticSave':
+        # 估算用的副本与正式输出使用相同随机序列，保证结构部分一致
+        clone = object.__new__(SyntheticSave)
+        clone.__dict__.update(save.__dict__)
+        clone.rng = random.Random()
+        clone.rng.setstate(save.rng.getstate())
+        return clone
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成 Stellaris gamestate（性能/扩展性测试用）')
+    parser.add_argument('-o', '--out', required=True, help='输出路径（.txt 或配合 --sav 使用 .sav）')
+    parser.add_argument('--events', type=int, default=10000, help='玩家时间线事件数（默认 10000）')
+    parser.add_argument('--size', type=float, default=0, help='目标文件总大小 MB（不足时用无关段填充，默认不填充）')
+    parser.add_argument('--countries', type=int, default=8, help='国家数量（默认 8）')
+    parser.add_argument('--timelines', type=int, default=1, help='带 timeline_events 的国家数，模拟多人存档（默认 1）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子（默认 42）')
+    parser.add_argument('--sav', action='store_true', help='打包为 .sav（zip: gamestate + meta）')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    save = SyntheticSave(args.events, args.size, args.countries, args.timelines, args.seed)
+    save.write(args.out, args.sav)
+    print(f"✅ 已生成: {args.out} ({os.path.getsize(args.out) / 1048576:.1f} MB, {args.events} 个玩家时间线事件)")
+
+
+if __name__ == '__main__':
+    main()
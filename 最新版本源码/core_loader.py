@@ -0,0 +1,55 @@
+# 按文件路径加载 GUI 脚本中内嵌的核心生成器，供 性能测试/ 等脚本复用
+# GUI 文件名带版本号（含 "."），无法直接 import；升级版本时只需改 CORE_FILE
+
+import os
+import sys
+import random
+import contextlib
+import importlib.util
+from typing import Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORE_FILE = os.path.join(HERE, 'gui_stellaris_chronicle_generator_v0.12.py')
+MODULE_NAME = 'stellaris_chronicle_core'
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽其间的 print 输出（生成器横幅、各阶段提示）"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def load_core(quiet: bool = True):
+    """加载并缓存核心模块；无需安装 customtkinter。quiet 时屏蔽加载过程中的输出"""
+    if MODULE_NAME in sys.modules:
+        return sys.modules[MODULE_NAME]
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)  # 让核心能找到 version.py
+    spec = importlib.util.spec_from_file_location(MODULE_NAME, CORE_FILE)
+    module = importlib.util.module_from_spec(spec)
+    # 先登记再执行，dataclass 与多进程 pickle 都需要能通过模块名找回
+    sys.modules[MODULE_NAME] = module
+    try:
+        with (_quiet() if quiet else contextlib.nullcontext()):
+            spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[MODULE_NAME]
+        raise
+    return module
+
+
+_quiet = quiet  # load_core 的参数同名，内部经别名调用
+
+
+def make_generator(seed: Optional[int] = None, **opts):
+    """不打印横幅地创建生成器；seed 不为 None 时先设定随机种子，
+    opts 依次调用对应的 set_<名称>，如 make_generator(42, country='all', parse_workers=1)"""
+    core = load_core()
+    if seed is not None:
+        random.seed(seed)
+    with _quiet():
+        gen = core.StellarisChronicleGenerator()
+        for name, value in opts.items():
+            getattr(gen, 'set_' + name)(value)
+    return gen
@@ -23,6 +23,9 @@ from datetime import datetime
 from typing import Optional, Dict
 import webbrowser
 import json
+import signal
+import multiprocessing
+import argparse
 import urllib.request
 import urllib.error
 
@@ -41,8 +44,7 @@ except Exception:
 try:
     import customtkinter as ctk
 except ImportError:
-    print("请先安装依赖: pip install customtkinter")
-    raise
+    ctk = None  # 命令行模式不依赖图形界面，启动 GUI 时再提示安装
 
 """
 为便携性起见，直接内嵌核心生成器（原 stellaris_chronicle_generator_v0.03.py）。
@@ -52,16 +54,176 @@ except ImportError:
 
 # === 内嵌核心生成器开始 ===
 import re
+import mmap
+import time
 import random
-from dataclasses import dataclass
-from typing import List, Tuple, Any
+import shutil
+import contextlib
+from dataclasses import dataclass, field
+from typing import List, Tuple, Any, Callable, Set
+
+DAYS_PER_YEAR = 360  # 游戏历法：每年 12 个月、每月 30 天
+DAYS_PER_MONTH = 30
+
+def date_to_ordinal(date: str) -> int:
+    """"2250.03.15" → 日期序数；缺少的月、日按 1 计（"2250.03" 即 2250.03.01），无法识别时为 -1"""
+    parts = date.split('.')
+    try:
+        y = int(parts[0]); m = int(parts[1]) if len(parts) > 1 else 1; d = int(parts[2]) if len(parts) > 2 else 1
+    except ValueError:
+        return -1
+    return y * DAYS_PER_YEAR + (m - 1) * DAYS_PER_MONTH + (d - 1)
+
+def ordinal_to_date(ordinal: int) -> str:
+    y, rest = divmod(int(ordinal), DAYS_PER_YEAR)
+    m, d = divmod(rest, DAYS_PER_MONTH)
+    return f"{y}.{m + 1:02d}.{d + 1:02d}"
+
+class EventPatterns:
+    """时间线扫描用的正则；同一组模式分别编译为 str 版（已解码文本）与 bytes 版（直接扫描内存映射）
+
+    所有重复都以定界符或前后断言收住，最坏情况也只线性扫描一遍。结构部分全是 ASCII，
+    bytes 版只在取出日期、代码与 data 中的值时才解码。
+    """
+    def __init__(self, as_bytes: bool):
+        c = (lambda p, f=0: re.compile(p.encode(), f)) if as_bytes else re.compile
+        self.as_bytes = as_bytes
+        self.timeline = c(r'timeline_events\s*=\s*\{')
+        self.country = c(r'^country[ \t]*=[ \t]*\{', re.MULTILINE)
+        # 国家段内一遍扫描：第 1 组命中为国家条目 "\t<id>={"，否则为其下的时间线块
+        self.owner = c(r'^\t(\d+)[ \t]*=[ \t]*\{|timeline_events\s*=\s*\{', re.MULTILINE)
+        self.brace = c(r'(\{)|\}')  # 第 1 组命中即左括号
+        self.date = c(r'date\s*=\s*"([^"\n]+)"')
+        self.definition = c(r'definition\s*=\s*"([^"\n]+)"')
+        self.data = c(r'data\s*=\s*\{([^}]*)\}')
+        self.numbers = c(r'[\d\s]+')
+        self.indexed = c(r'^[ \t]*\d+\s*=', re.MULTILINE)
+        self.item = c(r'(?<!\d)(\d+)\s*=\s*"([^"]*)"')
+        self.kv = c(r'(?<!\w)(\w+)\s*=\s*"([^"]*)"')
+
+    def text(self, value) -> str:
+        return value.decode('utf-8', 'replace') if self.as_bytes else value
+
+    def depth_change(self, buf, start: int, end: int) -> int:
+        """buf[start:end] 中左括号数 − 右括号数"""
+        if isinstance(buf, mmap.mmap):
+            # mmap 没有 count 方法；直接在映射上逐个匹配括号，不切出区间副本
+            return sum(1 if bm.lastindex else -1 for bm in self.brace.finditer(buf, start, end))
+        o, c = ('{', '}') if not self.as_bytes else (b'{', b'}')
+        return buf.count(o, start, end) - buf.count(c, start, end)
+
+class RawSpan:
+    """事件原文在共享缓冲区（解码后的存档文本或存档的内存映射）中的区间，仅在访问时才切出字符串"""
+    __slots__ = ('buf', 'start', 'end')
+
+    def __init__(self, buf, start: int, end: int):
+        self.buf = buf; self.start = start; self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __str__(self) -> str:
+        raw = self.buf[self.start:self.end]
+        return raw if isinstance(raw, str) else raw.decode('utf-8', 'replace')
+
+    def __repr__(self) -> str:
+        return f"RawSpan({self.start}, {self.end})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RawSpan) and str(self) == str(other)
 
 @dataclass
 class TimelineEvent:
     date: str
     definition: str
     data: Dict[str, Any]
-    raw_text: str
+    raw: Optional[RawSpan] = None  # 仅在 keep_raw 时记录，默认不为每个事件保留原文
+
+    @property
+    def raw_text(self) -> str:
+        return str(self.raw) if self.raw is not None else ''
+
+@dataclass
+class CountryTimeline:
+    """存档中的一个 timeline_events 块：发现阶段只记录区间与所属国家，解析后填入事件"""
+    country: str  # 所属国家 id；无法判断归属时为 "#序号"
+    start: int
+    end: int
+    events: List[TimelineEvent] = field(default_factory=list)
+    skipped: List[Tuple[str, str]] = field(default_factory=list)  # 被跳过事件的 (日期, 代码)，读不出的为 "?"
+    filtered: Dict[str, int] = field(default_factory=dict)
+
+@dataclass
+class FilterSpec:
+    """解析阶段的事件过滤条件：事件的日期与代码一读出就判断，被过滤的事件不再解析 data"""
+    exclude: Set[str] = field(default_factory=set)  # 排除的事件代码
+    only: Set[str] = field(default_factory=set)     # 非空时只保留这些事件代码
+    date_from: str = ''  # 起止日期（含），可只写年份或年月，如 "2250" / "2300.06"；空表示不限
+    date_to: str = ''
+
+    def accepts(self, date: str, definition: str) -> bool:
+        if definition in self.exclude or (self.only and definition not in self.only):
+            return False
+        if self.date_from and date < self.date_from:
+            return False
+        # 按前缀比较，"2300" 包含 2300 年全年
+        return not self.date_to or date[:len(self.date_to)] <= self.date_to
+
+    def is_empty(self) -> bool:
+        return not (self.exclude or self.only or self.date_from or self.date_to)
+
+@dataclass
+class EventStats:
+    """渲染编年史时顺带累计的事件统计，写统计文件时不再遍历事件列表"""
+    by_definition: Dict[str, int] = field(default_factory=dict)  # 时间线中各事件代码的条数
+    by_year: Dict[str, int] = field(default_factory=dict)        # 按日期的年份部分计数
+    unknown: Dict[str, int] = field(default_factory=dict)        # 未收录事件代码的条数
+    unknown_samples: Dict[str, TimelineEvent] = field(default_factory=dict)  # 每种未收录代码的第一条事件
+
+    @staticmethod
+    def _year_key(y: str):
+        return (0, int(y), '') if y.isdigit() else (1, 0, y)
+
+    def years(self) -> List[Tuple[str, int]]:
+        return sorted(self.by_year.items(), key=lambda kv: self._year_key(kv[0]))
+
+    def decades(self) -> List[Tuple[int, int, List[Tuple[str, int]]]]:
+        """(年代, 条数, 该年代内各年) ；年份不是数字的事件不计入"""
+        out: Dict[int, Tuple[int, List[Tuple[str, int]]]] = {}
+        for y, n in self.years():
+            if not y.isdigit(): continue
+            total, ys = out.get(int(y) // 10 * 10, (0, []))
+            ys.append((y, n)); out[int(y) // 10 * 10] = (total + n, ys)
+        return [(d, n, ys) for d, (n, ys) in out.items()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'by_definition': dict(sorted(self.by_definition.items(), key=lambda kv: (-kv[1], kv[0]))),
+            'by_year': dict(self.years()),
+            'by_decade': {str(d): n for d, n, _ in self.decades()},
+            'unknown_definitions': dict(sorted(self.unknown.items(), key=lambda kv: (-kv[1], kv[0]))),
+        }
+
+@dataclass
+class Era:
+    """编年史的一章：时间线中 [start, end) 下标范围内的事件"""
+    title: str
+    start: int
+    end: int
+    start_date: str
+    end_date: str
+    reason: str  # 'start' 开篇 / 'milestone' 里程碑 / 'surge' 事件骤增 / 'lull' 事件骤减
+
+@dataclass
+class ChronicleShard:
+    """分片输出中的一个文件：渲染时记下它在编年史中的起始行与初版文本中的偏移，替换占位符时换算为最终文本中的偏移"""
+    label: str         # 文件名中的说明：章标题、世纪范围或起始日期
+    line: int          # 起始行号（整份编年史中，0 起）
+    offset: int        # 在初版编年史中的起始字符偏移
+    start_date: str
+    end_date: str = ''
+    events: int = 0
+    final_offset: int = 0
 
 @dataclass
 class GeneratedEntity:
@@ -70,7 +232,822 @@ class GeneratedEntity:
     properties: Dict[str, Any]
     placeholder_id: str
 
+class ClausewitzNode:
+    """Clausewitz 文本中的一个 {...} 块（根节点为整个文件）：创建时只记录区间，首次访问时才扫描其直接子项；
+    子块同样只记录区间，访问到哪一层才展开哪一层，内存只与访问过的部分成正比"""
+    __slots__ = ('doc', 'start', 'end', '_items', '_first')
+
+    def __init__(self, doc: 'ClausewitzDocument', start: int, end: int):
+        self.doc = doc; self.start = start; self.end = end
+        self._items: Optional[List[Tuple[Optional[str], Any]]] = None
+        self._first: Optional[Dict[str, int]] = None
+
+    def _index(self) -> List[Tuple[Optional[str], Any]]:
+        if self._items is None:
+            self._items = self.doc._scan(self.start, self.end)
+            first: Dict[str, int] = {}
+            for i, (k, _) in enumerate(self._items):
+                if k is not None and k not in first: first[k] = i
+            self._first = first
+        return self._items
+
+    def __getitem__(self, key: str):
+        items = self._index()
+        return items[self._first[key]][1]
+
+    def get(self, key: str, default=None):
+        items = self._index()
+        i = self._first.get(key)
+        return default if i is None else items[i][1]
+
+    def getall(self, key: str) -> List[Any]:
+        """同名键的全部取值（如 ethos 中的多个 ethic）"""
+        return [v for k, v in self._index() if k == key]
+
+    def __contains__(self, key: str) -> bool:
+        self._index()
+        return key in self._first
+
+    def __len__(self) -> int:
+        return len(self._index())
+
+    def __iter__(self):
+        self._index()
+        return iter(self._first)
+
+    def keys(self) -> List[str]:
+        return list(self)
+
+    def items(self) -> List[Tuple[Optional[str], Any]]:
+        """按原文顺序的 (键, 值)；无键的数组元素键为 None，值为 str 或 ClausewitzNode"""
+        return list(self._index())
+
+    def elements(self) -> List[Any]:
+        """无键的数组元素，如 ships={ 1 2 3 } 的 ['1', '2', '3']"""
+        return [v for k, v in self._index() if k is None]
+
+    def text(self) -> str:
+        return self.doc.text(self.start, self.end)
+
+    def to_python(self):
+        """整棵子树展开为 dict/list（只适合小子树）：全是数组元素时为 list，同名键合并为 list，
+        有键与无键混合时无键元素放在 '_items' 下"""
+        return self.assemble([(k, v.to_python() if isinstance(v, ClausewitzNode) else v) for k, v in self._index()])
+
+    @staticmethod
+    def assemble(items: List[Tuple[Optional[str], Any]]):
+        """把一层已转换好的 (键, 值) 组装成 dict/list，规则同 to_python"""
+        if items and all(k is None for k, _ in items):
+            return [v for _, v in items]
+        seen: Set[str] = set(); multi: Set[str] = set()
+        for k, _ in items:
+            if k is not None: (multi if k in seen else seen).add(k)
+        out: Dict[str, Any] = {}
+        for k, v in items:
+            if k is None:
+                out.setdefault('_items', []).append(v)
+            elif k in multi:
+                out.setdefault(k, []).append(v)
+            else:
+                out[k] = v
+        return out
+
+    def __repr__(self) -> str:
+        return f"ClausewitzNode({self.start}, {self.end})"
+
+class ClausewitzDocument:
+    """可按路径导航的 Clausewitz 文档：doc['country']['12']['name']['key']
+
+    只读映射存档文件（也可传入 bytes），不建完整的树：每个节点首次访问时扫描一层子项，
+    跳过子块时先按缩进在 C 层查找块尾（存档以制表符缩进，块尾是缩进与块头行相同的 "}" 行），
+    并用括号计数核对；格式不规整时退回逐个括号配对。close() 只释放映射，再次访问时重新映射"""
+    TOKEN_RE = re.compile(rb'[ \t\r\n]*(?:("(?:[^"\\\n]|\\.)*")|(\{)|(\})|([^\s={}<>"#]+)|(#[^\n]*|[=<>"]))')
+    OP_RE = re.compile(rb'[ \t\r\n]*(?:=|<=|>=|<|>)')
+    BRACE_RE = re.compile(rb'(\{)|\}')
+    COUNT_CHUNK = 1 << 20  # 核对括号时每次切出的字节数（mmap 不能直接 count）
+
+    def __init__(self, source):
+        """source 为存档路径，或已在内存中的 bytes"""
+        if isinstance(source, (bytes, bytearray)):
+            self.path = ''; self._buf = bytes(source)
+        else:
+            self.path = source; self._buf = None
+        self._root: Optional[ClausewitzNode] = None
+
+    @classmethod
+    def from_text(cls, text: str) -> 'ClausewitzDocument':
+        return cls(text.encode('utf-8'))
+
+    @property
+    def buf(self):
+        if self._buf is None:
+            with open(self.path, 'rb') as f:
+                self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buf
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close(); self._buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def root(self) -> ClausewitzNode:
+        if self._root is None:
+            self._root = ClausewitzNode(self, 0, len(self.buf))
+        return self._root
+
+    def __getitem__(self, key: str):
+        return self.root[key]
+
+    def get(self, key: str, default=None):
+        return self.root.get(key, default)
+
+    def path_get(self, *path: str, default=None):
+        """沿路径逐层取值，任一层缺失或不是块时返回 default"""
+        node: Any = self.root
+        for key in path:
+            if not isinstance(node, ClausewitzNode): return default
+            node = node.get(key)
+            if node is None: return default
+        return node
+
+    def text(self, start: int, end: int) -> str:
+        return self.buf[start:end].decode('utf-8', 'replace')
+
+    @staticmethod
+    def _atom(raw: bytes) -> str:
+        if raw[:1] == b'"':
+            raw = raw[1:-1].replace(b'\\"', b'"')
+        return raw.decode('utf-8', 'replace')
+
+    def query(self, expr: str):
+        """按路径表达式逐条产出 (路径, 值)，语法见 ClausewitzQuery"""
+        return ClausewitzQuery(expr).run(self)
+
+    def _scan(self, start: int, end: int) -> List[Tuple[Optional[str], Any]]:
+        """扫描 [start, end) 的直接子项：key=值、key={...}、无键元素与匿名块；子块只记录区间"""
+        return list(self._iter_items(start, end))
+
+    def _iter_items(self, start: int, end: int):
+        """_scan 的逐项版本，不保留已产出的子项"""
+        buf = self.buf; T = self.TOKEN_RE
+        pos = start
+        while pos < end:
+            m = T.match(buf, pos, end)
+            if not m: break
+            pos = m.end()
+            if m.lastindex in (3, 5):
+                continue  # 多余的右括号、注释或孤立符号（格式损坏时）直接跳过
+            if m.lastindex == 2:
+                pos = self._close(m.start(2), end)
+                yield None, ClausewitzNode(self, m.end(2), pos - 1); continue
+            atom = self._atom(m.group(m.lastindex))
+            o = self.OP_RE.match(buf, pos, end)
+            if not o:
+                yield None, atom; continue
+            v = T.match(buf, o.end(), end)
+            if not v or v.lastindex in (3, 5):
+                yield atom, ''; pos = o.end(); continue
+            pos = v.end()
+            if v.lastindex == 2:
+                pos = self._close(v.start(2), end)
+                yield atom, ClausewitzNode(self, v.end(2), pos - 1)
+            else:
+                yield atom, self._atom(v.group(v.lastindex))
+
+    def _close(self, p: int, limit: int) -> int:
+        """p 处左括号配对的右括号之后的位置；始终不配对时返回 limit"""
+        buf = self.buf
+        q = p + 1
+        while q < limit and buf[q] in (32, 9, 13): q += 1
+        if q < limit and buf[q] == 10:  # 左括号在行尾：按缩进找块尾
+            ls = buf.rfind(b'\n', 0, p) + 1
+            t = 0
+            while buf[ls + t] == 9: t += 1
+            c = buf.find(b'\n' + b'\t' * t + b'}', p, limit)
+            if c >= 0 and self._balanced(p, c + t + 2):
+                return c + t + 2
+        depth = 0
+        for bm in self.BRACE_RE.finditer(buf, p, limit):
+            depth += 1 if bm.lastindex else -1
+            if depth == 0: return bm.end()
+        return limit
+
+    def _balanced(self, start: int, end: int) -> bool:
+        buf = self.buf
+        if isinstance(buf, bytes):
+            return buf.count(b'{', start, end) == buf.count(b'}', start, end)
+        n = 0
+        for i in range(start, end, self.COUNT_CHUNK):
+            chunk = buf[i:min(end, i + self.COUNT_CHUNK)]
+            n += chunk.count(b'{') - chunk.count(b'}')
+        return n == 0
+
+class ClausewitzQuery:
+    """存档路径查询，如 country.*.name、timeline_events[definition=timeline_first_contact].date
+
+    - 各步以 . 分隔：键名（含 . [ ] 或空白时加引号）、* 任意子项、** 任意多层（含零层）
+    - 每步可带过滤条件 [键=值]、[键!=值]、[键<值]（<= > >= 同理，数字与日期按数值比较）、[键]（存在该键），多个条件需同时满足
+    - 命中的块若由匿名块组成（如 timeline_events），逐个元素继续匹配并逐个产出，路径中记为序号
+    - 首步不是顶层段名时视为相对查询，在任意深度查找（相当于前缀 **.）
+    惰性求值：只展开路径经过的块，键不符的子块按括号整段跳过；进入子块前先在字节层面确认后续步骤
+    用到的键名与过滤值都出现在其区间内，否则不扫描"""
+    STEP_RE = re.compile(r'\s*(\*\*|\*|"[^"]*"|[^.\[\]"\s]+)((?:\s*\[[^\]]*\])*)\s*(\.|$)')
+    PRED_RE = re.compile(r'\s*\[\s*("[^"]*"|[^\]=!<>\s]+)\s*(?:(!=|<=|>=|=|<|>)\s*("[^"]*"|[^\]]*?))?\s*\]')
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.steps: List[Tuple[str, List[Tuple[str, Optional[str], Optional[str]]]]] = []
+        pos = 0
+        while pos < len(expr):
+            m = self.STEP_RE.match(expr, pos)
+            if not m or (not m.group(3) and m.end() < len(expr)):
+                raise ValueError(f'查询语法错误（第 {pos + 1} 个字符附近）: {expr}')
+            preds = []; p = 0; group = m.group(2)
+            for pm in self.PRED_RE.finditer(group):
+                if pm.start() != p: break
+                preds.append((self._unquote(pm.group(1)), pm.group(2), None if pm.group(3) is None else self._unquote(pm.group(3))))
+                p = pm.end()
+            if p != len(group):
+                raise ValueError(f'过滤条件语法错误: {group.strip()}')
+            name = self._unquote(m.group(1))
+            if name == '**' and preds:
+                raise ValueError('** 不能带过滤条件')
+            self.steps.append((name, preds))
+            pos = m.end()
+            if m.group(3) == '.' and pos >= len(expr):
+                raise ValueError(f'查询不能以 . 结尾: {expr}')
+        if not self.steps or self.steps[-1][0] == '**':
+            raise ValueError(f'查询必须以键名或 * 结尾: {expr}')
+
+    @staticmethod
+    def _unquote(s: str) -> str:
+        return s[1:-1] if len(s) >= 2 and s[0] == s[-1] == '"' else s.strip()
+
+    @staticmethod
+    def _compare(a: str, op: str, b: str) -> bool:
+        if op == '=': return a == b
+        if op == '!=': return a != b
+        try:
+            if a.count('.') < 2 and b.count('.') < 2:
+                x, y = float(a), float(b)
+            else:  # 日期 2250.01.01 与年份 2250 之类按各段整数比较
+                x, y = tuple(int(t) for t in a.split('.')), tuple(int(t) for t in b.split('.'))
+        except ValueError:
+            x, y = a, b
+        return x < y if op == '<' else x <= y if op == '<=' else x > y if op == '>' else x >= y
+
+    def run(self, doc: ClausewitzDocument):
+        """惰性生成器，逐条产出 (路径, 值)；值为 str 或 ClausewitzNode"""
+        steps = self.steps
+        if steps[0][0] not in ('*', '**') and steps[0][0] not in doc.root:
+            steps = [('**', [])] + steps
+        # required[i]：第 i 步命中的子块里必须出现的字节串（本步过滤条件 + 之后各步的键名与过滤条件）
+        plain = lambda x: x.encode('utf-8') if '"' not in x and '\\' not in x else None  # 含转义的写法与原文不一定相同
+        names = [[plain(n)] if n not in ('*', '**') else [] for n, _ in steps]
+        conds = [[plain(x) for k, op, v in preds for x in (k, v) if x and op in (None, '=')] for _, preds in steps]
+        required = [sorted({x for x in conds[i] + [x for j in range(i + 1, len(steps)) for x in names[j] + conds[j]] if x}, key=len, reverse=True)
+                    for i in range(len(steps))]  # 长的字节串通常更少见，先查它
+        return self._walk(doc, steps, required, doc.root, 0, [])
+
+    @staticmethod
+    def _children(doc: ClausewitzDocument, node: ClausewitzNode):
+        return node._items if node._items is not None else doc._iter_items(node.start, node.end)
+
+    @staticmethod
+    def _may_match(doc: ClausewitzDocument, node: ClausewitzNode, req: List[bytes]) -> bool:
+        buf = doc.buf
+        return all(buf.find(x, node.start, node.end) >= 0 for x in req)
+
+    def _expand(self, doc: ClausewitzDocument, path: list, value):
+        """命中的值；匿名块组成的数组展开为各个元素"""
+        if not isinstance(value, ClausewitzNode):
+            yield path, value; return
+        it = iter(self._children(doc, value))
+        first = next(it, None)
+        if first is None or first[0] is not None or not isinstance(first[1], ClausewitzNode):
+            yield path, value; return
+        yield path + [0], first[1]
+        for i, (k, v) in enumerate(it, 1):
+            if k is None and isinstance(v, ClausewitzNode):
+                yield path + [i], v
+
+    def _walk(self, doc: ClausewitzDocument, steps, required, node: ClausewitzNode, i: int, path: list):
+        name, preds = steps[i]
+        if name == '**':
+            yield from self._walk(doc, steps, required, node, i + 1, path)
+            for n, (k, v) in enumerate(self._children(doc, node)):
+                if isinstance(v, ClausewitzNode) and self._may_match(doc, v, required[i]):
+                    yield from self._walk(doc, steps, required, v, i, path + [n if k is None else k])
+            return
+        last = i == len(steps) - 1
+        for n, (k, v) in enumerate(self._children(doc, node)):
+            if name != '*' and k != name:
+                continue
+            for p, c in self._expand(doc, path + [n if k is None else k], v):
+                if preds or not last:
+                    if not isinstance(c, ClausewitzNode) or not self._may_match(doc, c, required[i]):
+                        continue
+                    if preds:
+                        items = c._index()
+                        if not all(any(ck == pk and (op is None or isinstance(cv, str) and self._compare(cv, op, pv)) for ck, cv in items)
+                                   for pk, op, pv in preds):
+                            continue
+                if last:
+                    yield p, c
+                else:
+                    yield from self._walk(doc, steps, required, c, i + 1, p)
+
+class ClausewitzHandler:
+    """流式解析的回调接口，默认不做任何事，子类按需覆盖。事件顺序：
+    key=值 → key(名) value(值)；key={...} → key(名) start_block() ... end_block()；无键元素只有 value / start_block"""
+    def key(self, name: str):
+        pass
+
+    def value(self, value: str):
+        pass
+
+    def start_block(self) -> Optional[bool]:
+        """返回 False 时跳过整个块：不再回调块内内容，也不回调对应的 end_block"""
+        return None
+
+    def end_block(self):
+        pass
+
+class ClausewitzStreamParser:
+    """事件驱动（SAX 式）解析：在映射的存档上逐个记号回调，不建树，内存与存档大小无关；
+    只解析指定的顶层段时，其余段借助文档的顶层索引整段跳过"""
+    # 1 带引号的值 / 2 裸值，3 其后紧跟的运算符（有则为键）；4 左括号；5 右括号；6 注释或孤立符号
+    STREAM_RE = re.compile(rb'[ \t\r\n]*(?:(?:("(?:[^"\\\n]|\\.)*")|([^\s={}<>"#]+))([ \t\r\n]*(?:=|<=|>=|<|>))?|(\{)|(\})|(#[^\n]*|[=<>"]))')
+
+    def __init__(self, doc: ClausewitzDocument):
+        self.doc = doc
+
+    def parse(self, handler: ClausewitzHandler, sections: Optional[Set[str]] = None):
+        if sections is None:
+            self.parse_span(handler, 0, len(self.doc.buf))
+            return
+        for k, v in self.doc.root.items():
+            if k not in sections:
+                continue
+            handler.key(k)
+            if not isinstance(v, ClausewitzNode):
+                handler.value(v)
+            elif handler.start_block() is not False:
+                self.parse_span(handler, v.start, v.end)
+                handler.end_block()
+
+    def parse_span(self, handler: ClausewitzHandler, start: int, end: int):
+        buf = self.doc.buf; S = self.STREAM_RE; atom = ClausewitzDocument._atom
+        pos = start; depth = 0
+        while pos < end:
+            m = S.match(buf, pos, end)
+            if not m: break
+            pos = m.end(); li = m.lastindex
+            if li == 4:
+                if handler.start_block() is False:
+                    pos = self.doc._close(m.start(4), end)
+                else:
+                    depth += 1
+            elif li == 5:
+                if depth:
+                    depth -= 1; handler.end_block()
+            elif li == 3:
+                handler.key(atom(m.group(1) or m.group(2)))
+            elif li != 6:
+                handler.value(atom(m.group(li)))
+        while depth:  # 存档被截断时补齐未闭合的块
+            depth -= 1; handler.end_block()
+
+class NdjsonWriter(ClausewitzHandler):
+    """把流式解析事件写成 NDJSON：每个位于第 depth 层（段本身为第 0 层）的子项一行 {"path": [...], "value": ...}；
+    同一时刻只有正在输出的那个条目在内存中，写出后即丢弃"""
+    def __init__(self, out, depth: int = 1):
+        self.out = out; self.depth = depth
+        self.path: List[Optional[str]] = []  # 尚未进入输出层时经过的各层键
+        self.level = 0
+        self.pending: Optional[str] = None
+        self.frames: List[Tuple[Optional[str], List[Tuple[Optional[str], Any]]]] = []  # 正在组装的条目，每层 (键, 子项)
+        self.lines = 0
+
+    def key(self, name: str):
+        self.pending = name
+
+    def value(self, value: str):
+        k, self.pending = self.pending, None
+        if self.frames:
+            self.frames[-1][1].append((k, value))
+        elif self.level <= self.depth:
+            self._emit(self.path + [k], value)
+
+    def start_block(self):
+        k, self.pending = self.pending, None
+        if self.frames or self.level >= self.depth:
+            self.frames.append((k, []))
+        else:
+            self.path.append(k)
+        self.level += 1
+
+    def end_block(self):
+        self.level -= 1; self.pending = None
+        if not self.frames:
+            self.path.pop(); return
+        k, items = self.frames.pop()
+        v = ClausewitzNode.assemble(items)
+        if self.frames:
+            self.frames[-1][1].append((k, v))
+        else:
+            self._emit(self.path + [k], v)
+
+    def _emit(self, path: List[Optional[str]], value: Any):
+        self.out.write(json.dumps({'path': path, 'value': value}, ensure_ascii=False) + '\n')
+        self.lines += 1
+
+@dataclass
+class CountryInfo:
+    """存档 country 段中一个国家的基本信息；思潮与政体保持存档原文（如 ethic_xenophobe），由生成器翻译"""
+    country_id: str
+    name: Optional[str]  # 本地化键（如 EMPIRE_DESIGN_humans1）无法直接显示时为 None
+    ethics: List[str]
+    authority: str
+
+class SaveIndex:
+    """存档的按需索引，每个存档一份，建立在 ClausewitzDocument 之上：
+    各段的 id → 条目在首次查询该段时扫描一层得到，条目内容在首次查询该 id 时才展开并缓存，之后 O(1)"""
+    # 实体类别 → 存档中按 id 编号的条目所在路径
+    ENTITY_PATHS = {'planet': ('planets', 'planet'), 'system': ('galactic_object',),
+                    'leader': ('leaders',), 'fleet': ('fleet',), 'ship': ('ships',)}
+    # 无法直接显示的本地化键：预设帝国/设计名或 %ADJ% 之类的模板；玩家自己起的名字可以含 _ 或 %
+    LOC_KEY_RE = re.compile(r'(?:EMPIRE_DESIGN_|PRESCRIPTED_).*|.*%[A-Z0-9_]+%.*', re.DOTALL)
+
+    def __init__(self, path: str):
+        self.path = path
+        self.doc = ClausewitzDocument(path)
+        self._countries: Dict[str, Optional[CountryInfo]] = {}
+        self._values: Dict[Tuple[Tuple[str, ...], str, str], Optional[str]] = {}
+
+    def close(self):
+        self.doc.close()
+
+    def entry(self, path: Tuple[str, ...], entry_id: str) -> Optional[ClausewitzNode]:
+        node = self.doc.path_get(*path, entry_id)
+        return node if isinstance(node, ClausewitzNode) else None
+
+    @staticmethod
+    def readable(key: str) -> Optional[str]:
+        """名称若是本地化键则无法直接显示：NAME_Sol 取 Sol，EMPIRE_DESIGN_/PRESCRIPTED_ 键与 %…% 模板返回 None"""
+        if key.startswith('NAME_'):
+            return key[5:].replace('_', ' ') or None
+        if not key or SaveIndex.LOC_KEY_RE.fullmatch(key):
+            return None
+        return key
+
+    @classmethod
+    def _display_name(cls, node: ClausewitzNode) -> Optional[str]:
+        name = node.get('name')
+        if isinstance(name, ClausewitzNode):
+            name = name.get('key') or name.get('first_name')
+        return cls.readable(name) if isinstance(name, str) else None
+
+    def name(self, path: Tuple[str, ...], entry_id: str) -> Optional[str]:
+        """path 下 id 为 entry_id 的条目的可显示名称"""
+        key = (path, entry_id, 'name')
+        if key not in self._values:
+            node = self.entry(path, entry_id)
+            self._values[key] = self._display_name(node) if node is not None else None
+        return self._values[key]
+
+    def entity_name(self, kind: str, entity_id: str) -> Optional[str]:
+        """按类别（见 ENTITY_PATHS）取实体名称；只有被查询到的 id 才会展开"""
+        return self.name(self.ENTITY_PATHS[kind], entity_id)
+
+    def planet_system(self, planet_id: str) -> Optional[str]:
+        """星球所在星系的 id（coordinate 块中的 origin）"""
+        key = (self.ENTITY_PATHS['planet'], planet_id, 'origin')
+        if key not in self._values:
+            node = self.entry(self.ENTITY_PATHS['planet'], planet_id)
+            coord = node.get('coordinate') if node is not None else None
+            origin = coord.get('origin') if isinstance(coord, ClausewitzNode) else None
+            self._values[key] = origin if isinstance(origin, str) else None
+        return self._values[key]
+
+    def country(self, country_id: str) -> Optional[CountryInfo]:
+        if country_id not in self._countries:
+            node = self.entry(('country',), country_id)
+            info = None
+            if node is not None:
+                ethos = node.get('ethos')
+                ethics = [e for e in ethos.getall('ethic') if isinstance(e, str)] if isinstance(ethos, ClausewitzNode) else []
+                gov = node.get('government')
+                auth = gov.get('authority') if isinstance(gov, ClausewitzNode) else None
+                info = CountryInfo(country_id, self._display_name(node), ethics, auth if isinstance(auth, str) else '')
+            self._countries[country_id] = info
+        return self._countries[country_id]
+
+@dataclass
+class ProgressInfo:
+    stage: str        # 阶段代码，见 ProgressReporter.STAGES
+    label: str        # 阶段显示名
+    done: int
+    total: int
+    unit: str         # "bytes" 或 "events"
+    elapsed: float    # 本阶段已用秒数
+    rate: float       # 每秒处理的单位数
+    eta: Optional[float]  # 本阶段预计剩余秒数，无法估计时为 None
+    percent: float    # 全流程总体进度 0-100
+
+    def describe(self) -> str:
+        """格式化为界面/命令行显示的一行文本"""
+        text = f"{self.label} {self.percent:.0f}%"
+        if self.rate > 0:
+            if self.unit == 'bytes':
+                text += f" · {self.rate / 1048576:.1f} MB/s"
+            else:
+                text += f" · {self.rate:,.0f} 条/s"
+        if self.eta is not None and self.done < self.total:
+            text += f" · 剩余 {self.eta:.0f}s"
+        return text
+
+class ProgressReporter:
+    """按阶段汇报真实进度（字节/事件数），并把回调频率节流到界面可承受的速率"""
+    # 阶段代码: (总体起点%, 总体终点%, 显示名)
+    STAGES = {
+        'read': (5, 25, '读取存档'),
+        'extract': (25, 30, '定位时间线'),
+        'parse': (30, 55, '解析事件'),
+        'render': (55, 75, '初版编年史'),
+        'substitute': (75, 85, '替换占位符'),
+        'settings': (85, 90, '生成设定'),
+        'save': (90, 100, '保存文件'),
+    }
+
+    def __init__(self, callback: Optional[Callable[[ProgressInfo], None]] = None, min_interval: float = 0.1):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.stage = ''
+        self.total = 0
+        self.unit = 'bytes'
+        self._started = 0.0
+        self._last_emit = 0.0
+
+    def start(self, stage: str, total: int, unit: str = 'bytes'):
+        self.stage = stage; self.total = max(int(total), 0); self.unit = unit
+        self._started = time.monotonic(); self._last_emit = 0.0
+        self.update(0, force=True)
+
+    def update(self, done: int, force: bool = False):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+        self.callback(self._snapshot(done, now))
+
+    def finish(self):
+        self.update(self.total, force=True)
+
+    def _snapshot(self, done: int, now: float) -> ProgressInfo:
+        lo, hi, label = self.STAGES.get(self.stage, (0, 100, self.stage))
+        if self.total: done = min(done, self.total)
+        elapsed = now - self._started
+        frac = min(done / self.total, 1.0) if self.total else 1.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate > 0 else None
+        return ProgressInfo(self.stage, label, done, self.total, self.unit, elapsed, rate, eta, lo + (hi - lo) * frac)
+
+@dataclass
+class StageRecord:
+    name: str
+    wall: float = 0.0    # 墙钟秒数
+    cpu: float = 0.0     # 工作线程 CPU 秒数
+    bytes: int = 0       # 本阶段处理的字节（字符）数
+    events: int = 0      # 本阶段处理的事件/条目数
+    peak_mem: Optional[int] = None  # 深度分析模式下 tracemalloc 记录的峰值内存
+    mem_start: Optional[int] = None  # 开启内存跟踪时，阶段开始/结束时的 tracemalloc 存活内存
+    mem_end: Optional[int] = None
+
+    def transient_mem(self) -> Optional[int]:
+        """阶段内临时副本占用：峰值减去阶段结束时仍存活的内存（即不计阶段产出）"""
+        if self.peak_mem is None or self.mem_end is None:
+            return None
+        return max(0, self.peak_mem - self.mem_end)
+
+    def to_dict(self) -> Dict[str, Any]:
+        label = ProgressReporter.STAGES.get(self.name, (0, 0, self.name))[2]
+        return {
+            'name': self.name, 'label': label,
+            'wall_s': round(self.wall, 6), 'cpu_s': round(self.cpu, 6),
+            'bytes': self.bytes, 'events': self.events,
+            'mb_per_s': round(self.bytes / 1048576 / self.wall, 3) if self.wall > 0 and self.bytes else None,
+            'events_per_s': round(self.events / self.wall, 1) if self.wall > 0 and self.events else None,
+            'peak_mem_bytes': self.peak_mem,
+            'transient_mem_bytes': self.transient_mem(),
+        }
+
+class StageProfiler:
+    """深度分析模式：每个阶段包裹 cProfile 与 tracemalloc，结果写入输出目录下的“性能分析”文件夹"""
+    def __init__(self, out_dir: str, top_n: int = 25):
+        self.out_dir = os.path.join(out_dir, '性能分析')
+        self.top_n = top_n
+        self._index = 0
+        self._own_tracing = False
+
+    def begin(self):
+        import cProfile, tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(); self._own_tracing = True
+        tracemalloc.reset_peak()
+        prof = cProfile.Profile()
+        prof.enable()
+        return prof
+
+    def end(self, prof, rec: StageRecord):
+        import io, pstats, tracemalloc
+        prof.disable()
+        rec.peak_mem = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._index += 1
+        base = os.path.join(self.out_dir, f"{self._index:02d}_{rec.name}")
+        prof.dump_stats(base + '.pstats')
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats('cumulative').print_stats(self.top_n)
+        lines = [f"阶段: {rec.to_dict()['label']} ({rec.name})",
+                 f"墙钟 {rec.wall:.3f}s / CPU {rec.cpu:.3f}s（含分析器开销）",
+                 f"峰值内存 (tracemalloc): {rec.peak_mem / 1048576:.2f} MB", "",
+                 f"存活内存分配 Top {self.top_n}（按源码行）:"]
+        for i, stat in enumerate(snapshot.statistics('lineno')[:self.top_n], 1):
+            lines.append(f"#{i:<3} {stat.size / 1024:10.1f} KiB  {stat.count:8d} 块  {stat.traceback}")
+        lines += ["", f"函数耗时 Top {self.top_n}（按累计时间，完整数据见 {os.path.basename(base)}.pstats）:", buf.getvalue()]
+        with open(base + '_分析.txt', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+    def close(self):
+        import tracemalloc
+        if self._own_tracing:
+            tracemalloc.stop(); self._own_tracing = False
+
+class TraceRecorder:
+    """记录 Chrome trace-event 格式的时间片段，可在 chrome://tracing 或 Perfetto 中查看各线程占用"""
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._pid = os.getpid()
+        self._t0 = time.perf_counter_ns()
+        self._named_threads = set()
+        self._lock = threading.Lock()
+
+    def now(self) -> int:
+        return (time.perf_counter_ns() - self._t0) // 1000
+
+    def complete(self, name: str, start_us: int, cat: str = 'pipeline', **args):
+        """记录一个从 start_us 持续到当前时刻的片段（"X" 事件）"""
+        end = self.now()
+        tid = threading.get_native_id()
+        ev = {'name': name, 'cat': cat, 'ph': 'X', 'ts': start_us, 'dur': end - start_us, 'pid': self._pid, 'tid': tid}
+        if args: ev['args'] = args
+        with self._lock:
+            if tid not in self._named_threads:
+                self._named_threads.add(tid)
+                self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                                    'args': {'name': threading.current_thread().name}})
+            self.events.append(ev)
+
+    def external(self, name: str, start_ns: int, end_ns: int, pid: int, cat: str = 'pipeline', **args):
+        """记录其他进程（如解析进程池）上报的片段；perf_counter_ns 为系统级单调时钟，可直接换算"""
+        ev = {'name': name, 'cat': cat, 'ph': 'X', 'ts': (start_ns - self._t0) // 1000,
+              'dur': (end_ns - start_ns) // 1000, 'pid': pid, 'tid': pid}
+        if args: ev['args'] = args
+        with self._lock:
+            if pid not in self._named_threads:
+                self._named_threads.add(pid)
+                self.events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid,
+                                    'args': {'name': f'解析进程 {pid}'}})
+            self.events.append(ev)
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = 'pipeline', **args):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.complete(name, start, cat, **args)
+
+    def save(self, path: str):
+        with self._lock:
+            data = {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+class PipelineMetrics:
+    """记录每个流水线阶段的墙钟/CPU 时间与处理量，写入统计文件与 JSON 附件"""
+    def __init__(self):
+        self.stages: List[StageRecord] = []
+        self.profiler: Optional[StageProfiler] = None  # 关闭深度分析时为 None，无额外开销
+        self.tracer: Optional[TraceRecorder] = None
+        self.track_memory = False  # 由调用方启动 tracemalloc 后打开，记录各阶段峰值与存活内存
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        import tracemalloc
+        rec = StageRecord(name)
+        prof = self.profiler.begin() if self.profiler is not None else None
+        tracking = self.track_memory and tracemalloc.is_tracing()
+        if tracking:
+            tracemalloc.reset_peak()
+            rec.mem_start = tracemalloc.get_traced_memory()[0]
+        t_us = self.tracer.now() if self.tracer is not None else 0
+        w0 = time.perf_counter(); c0 = time.thread_time()
+        try:
+            yield rec
+        finally:
+            rec.wall = time.perf_counter() - w0
+            rec.cpu = time.thread_time() - c0
+            self.stages.append(rec)
+            if self.tracer is not None:
+                self.tracer.complete(name, t_us, 'stage', bytes=rec.bytes, events=rec.events)
+            if prof is not None:
+                self.profiler.end(prof, rec)
+            if tracking:
+                rec.mem_end, peak = tracemalloc.get_traced_memory()
+                rec.peak_mem = peak if rec.peak_mem is None else max(rec.peak_mem, peak)
+
+    def rewind(self, n: int):
+        """只保留前 n 条阶段记录；全部国家模式下每个国家的统计只含共享的读取/解析阶段与它自己的阶段"""
+        del self.stages[n:]
+
+    def total_wall(self) -> float:
+        return sum(r.wall for r in self.stages)
+
+    def report_lines(self) -> List[str]:
+        lines = []
+        for r in self.stages:
+            d = r.to_dict()
+            text = f"- {d['label']}: 墙钟 {r.wall:.3f}s / CPU {r.cpu:.3f}s"
+            if r.bytes: text += f"，{r.bytes / 1048576:.2f} MB"
+            if r.events: text += f"，{r.events} 条"
+            if d['mb_per_s']: text += f"，{d['mb_per_s']:.1f} MB/s"
+            if d['events_per_s']: text += f"，{d['events_per_s']:,.0f} 条/s"
+            if r.peak_mem is not None: text += f"，峰值内存 {r.peak_mem / 1048576:.1f} MB"
+            lines.append(text)
+        lines.append(f"- 合计: 墙钟 {self.total_wall():.3f}s")
+        return lines
+
+class GenerationCancelled(Exception):
+    """生成任务被用户取消"""
+
+class CancellationToken:
+    """线程安全的取消标记；由界面/信号处理设置，流水线在分块与事件粒度检查"""
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled()
+
 class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
+    READ_CHUNK_SIZE = 4 * 1024 * 1024  # 分块读取存档，便于按字节汇报进度
+    WRITE_CHUNK_CHARS = 64 * 1024      # 分块写出，编码缓冲只占固定大小
+    RENDER_BATCH = 4096                # 初版编年史每批拼接的行数，避免整份行列表常驻
+    SUBSTITUTE_SEGMENT = 256 * 1024    # 占位符替换的分段字符数
+    PLACEHOLDER_RE = re.compile(r'\[([^\[\]\n]+)\]')
+    PARALLEL_MIN_CHARS = 16 * 1024 * 1024  # 时间线块超过该字符数才值得启动进程池
+    MAX_PARSE_WORKERS = 8
+    SKIPPED_LOG_LIMIT = 20                 # 每个时间线块在日志中逐条列出的异常事件数，全部见 生成统计.json
+    CHUNKS_PER_WORKER = 4                  # 每个进程分到的块数，块数多一些负载更均衡
+    # 模板中的名称字段 → 事件 data 里承载实体 id 的键（即 SaveIndex.ENTITY_PATHS 的类别）
+    NAME_FIELDS = {'planet_name': 'planet', 'colony_name': 'planet', 'new_capital': 'planet',
+                   'system_name': 'system', 'location': 'system',
+                   'leader_name': 'leader', 'fleet_name': 'fleet', 'ship_name': 'ship'}
+    ALL_COUNTRIES = 'all'  # set_country 取该值时为每个国家的时间线分别生成编年史
+    ERA_MIN_YEARS = 25        # 每章至少跨越的年数，之内的里程碑与密度变化不再分章
+    ERA_WINDOW_YEARS = 10     # 衡量近期事件密度的滑动窗口
+    ERA_DENSITY_RATIO = 2.0   # 窗口密度达到本章平均的该倍数（或降到其倒数）时另起一章
+    ERA_TITLES = {'start': '肇始', 'surge': '风云激荡', 'lull': '休养生息'}
+    CHAPTER_DIR = '编年史分章'   # 按章分片的输出目录
+    SHARD_DIR = '编年史分片'     # 按世纪或事件数分片的输出目录
+    SHARD_INDEX = '索引.json'
+    MAX_WRITE_WORKERS = 8
+
+    STR_PATTERNS = None    # 类定义后赋值，见 EventPatterns
+    BYTES_PATTERNS = None
+
     def __init__(self):
         print("=" * 60)
         print("群星（Stellaris）帝国编年史生成器 核心已内嵌 (基于 v0.03)")
@@ -80,17 +1057,38 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
         self.entity_counters = { 'empire': 0, 'species': 0, 'fallen_empire': 0, 'pre_ftl': 0 }
         self.player_empire_name = "玩家帝国"
         self.include_year_markers = True
+        self.event_filter = FilterSpec()
+        self.filtered_counts: Dict[str, int] = {}  # 解析阶段按过滤条件跳过的事件数（按事件代码）
         self.event_descriptions = self._initialize_event_descriptions()
         self.empire_generation_data = self._initialize_empire_data()
         self.planet_names = self._initialize_planet_names()
         self.leviathan_codes = self._initialize_leviathan_codes()
-        self.unknown_leviathan_codes = set()  # 用于收集未知的星神兽代码
+        self.unknown_leviathan_codes: Dict[str, int] = {}  # 未知星神兽代码 → 出现次数
+        self.event_stats = EventStats()  # 渲染时累计，统计文件直接使用
+        self.chapters = False        # 按纪元分章渲染编年史
+        self.shard_by: Any = ''      # 分片输出：'' 不分片 / 'chapter' 每章 / 'century' 每世纪 / 正整数 N 每 N 条事件
+        self.eras: List[Era] = []
+        self.shards: List[ChronicleShard] = []
+        self.year_lines: Dict[str, int] = {}  # 年份 → 该年第一条事件在编年史中的行号（分片时记录）
+        self.skipped_events = 0  # 缺少日期/代码或 data 无法解析而被跳过的事件数
+        self.skipped_list: List[Tuple[str, str]] = []  # 被跳过事件的 (日期, 代码)
+        self.parse_workers = 0   # 解析进程数，0 为自动
+        self.keep_raw = False    # 是否为每个事件保留原文区间（调试与未收录事件报告用）
+        self.country_choice = ''  # 要生成的国家 id；空为存档中第一个时间线块，ALL_COUNTRIES 为全部
+        self.country_timelines: List[CountryTimeline] = []  # 本次解析的时间线块
+        self.country = ''         # 当前时间线所属国家 id
+        self.save_index: Optional[SaveIndex] = None  # 按需建立的存档索引，同一存档复用
         
         # 新增：用户选择模式相关属性
         self.generation_mode = "random"  # "random" 或 "manual"
         self.manual_empire_names: Dict[str, str] = {}  # 手动输入的帝国名称
         self.manual_leviathan_names: Dict[str, str] = {}  # 手动输入的星神兽名称
         self.pending_entities: List[Dict[str, Any]] = []  # 待用户输入的实体信息
+        self.progress = ProgressReporter()  # 未设置回调时不产生任何开销
+        self.cancel_token = CancellationToken()
+        self.metrics = PipelineMetrics()
+        self.save_path = ''
+        self.trace_path = ''
 
     # ---- 以下方法从原脚本复制（做少量裁剪：去除命令行 run 交互） ----
     def _initialize_event_descriptions(self) -> Dict[str, str]:
@@ -231,7 +1229,13 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
             'traits': {
                 'positive': [ {'name':'智慧','cost':2,'weight':20},{'name':'强壮','cost':1,'weight':15},{'name':'天生工程师','cost':1,'weight':10},{'name':'快速增殖','cost':2,'weight':15},{'name':'适应性强','cost':2,'weight':12},{'name':'长寿','cost':1,'weight':8},{'name':'天生物理学家','cost':1,'weight':10},{'name':'天生社会学家','cost':1,'weight':10} ],
                 'negative': [ {'name':'柔弱','gain':1,'weight':15},{'name':'生长缓慢','gain':1,'weight':12},{'name':'离经叛道','gain':1,'weight':10},{'name':'不善变通','gain':2,'weight':8},{'name':'令人厌恶','gain':1,'weight':5},{'name':'短寿','gain':1,'weight':10} ]
-            }
+            },
+            # 存档中的思潮/政体键 → 中文名（ethic_fanatic_* 为对应的“极端”思潮）
+            'ethic_keys': {'xenophobe':'排外主义','xenophile':'亲外主义','materialist':'唯物主义','spiritualist':'唯心主义',
+                           'authoritarian':'威权主义','egalitarian':'平等主义','militarist':'军国主义','pacifist':'和平主义',
+                           'gestalt_consciousness':'格式塔意识'},
+            'authority_keys': {'auth_democratic':'民主制','auth_oligarchic':'寡头制','auth_dictatorial':'独裁制','auth_imperial':'帝制',
+                               'auth_hive_mind':'蜂巢思维','auth_machine_intelligence':'机械智能','auth_corporate':'企业制'}
         }
 
     def _initialize_planet_names(self) -> List[str]:
@@ -294,7 +1298,7 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
                 return self.leviathan_codes[code]
             else:
                 # 记录未知代码
-                self.unknown_leviathan_codes.add(code)
+                self.unknown_leviathan_codes[code] = self.unknown_leviathan_codes.get(code, 0) + 1
                 return "星神兽"
         
         return "星神兽"
@@ -310,6 +1314,39 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
         self.include_year_markers = include
         print("✅ 将包含年度标记事件" if include else "✅ 将跳过年度标记事件")
 
+    def set_chapters(self, enabled: bool, split: bool = False):
+        """按事件密度变化与里程碑把编年史分章；split 时另在“编年史分章”目录下每章写一个文件"""
+        self.chapters = enabled or split
+        if split:
+            self.shard_by = 'chapter'
+        if self.chapters:
+            print("✅ 将按纪元分章" + ("，并逐章另存" if split else ""))
+
+    def set_sharding(self, by):
+        """分片输出：'century' 每世纪一个文件，正整数 N 每 N 条事件一个文件，'chapter' 每章一个文件（同时开启分章），
+        空为不分片。分片与年份索引写在输出目录的子目录中，完整编年史照常输出"""
+        if by not in ('', 'chapter', 'century') and not (isinstance(by, int) and by > 0):
+            raise ValueError(f"无效的分片方式: {by}")
+        self.shard_by = by
+        if by == 'chapter':
+            self.chapters = True
+        if by:
+            print(f"✅ 编年史将分片输出: {'每章' if by == 'chapter' else '每世纪' if by == 'century' else f'每 {by} 条事件'}")
+
+    def set_event_filter(self, spec: FilterSpec):
+        """设置解析阶段的事件过滤条件（需在解析前调用）"""
+        self.event_filter = spec
+        if not spec.is_empty():
+            print(f"✅ 已设置事件过滤: 排除 {len(spec.exclude)} 种 / 仅保留 {len(spec.only) or '全部'} 种 / "
+                  f"日期 {spec.date_from or '开始'} ~ {spec.date_to or '结束'}")
+
+    def _effective_filter(self) -> Optional[FilterSpec]:
+        """合并用户过滤条件与年度标记选项；无任何条件时返回 None，解析时不做判断"""
+        spec = self.event_filter
+        if not self.include_year_markers:
+            spec = FilterSpec(spec.exclude | {'timeline_event_year'}, spec.only, spec.date_from, spec.date_to)
+        return None if spec.is_empty() else spec
+
     def set_generation_mode(self, mode: str):
         """设置生成模式：'random' 或 'manual'"""
         if mode in ["random", "manual"]:
@@ -318,11 +1355,45 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
         else:
             print(f"⚠ 无效的生成模式: {mode}")
 
+    def set_progress_callback(self, callback: Optional[Callable[[ProgressInfo], None]], min_interval: float = 0.1):
+        """设置进度回调；回调在工作线程中被调用，频率不超过 1/min_interval 次每秒"""
+        self.progress = ProgressReporter(callback, min_interval)
+
+    def enable_profiling(self, out_dir: str, top_n: int = 25):
+        """开启深度分析：各阶段的 .pstats 与内存分配报告写入 out_dir/性能分析"""
+        self.metrics.profiler = StageProfiler(out_dir, top_n)
+        print(f"🔬 已开启深度性能分析，结果将写入: {self.metrics.profiler.out_dir}")
+
+    def enable_tracing(self, out_dir: str, tracer: Optional[TraceRecorder] = None) -> TraceRecorder:
+        """开启 Chrome trace 导出；可传入共享的 tracer 以便界面线程记录到同一份追踪"""
+        self.metrics.tracer = tracer or TraceRecorder()
+        self.trace_path = os.path.join(out_dir, '性能分析', 'trace.json')
+        print(f"🧭 已开启追踪导出，结果将写入: {self.trace_path}")
+        return self.metrics.tracer
+
+    def _trace_mark(self, name: str, start_us: int, **args) -> int:
+        """记录分块片段并返回下一片段的起点；未开启追踪时为空操作"""
+        tracer = self.metrics.tracer
+        if tracer is None:
+            return 0
+        tracer.complete(name, start_us, 'chunk', **args)
+        return tracer.now()
+
+    def set_cancel_token(self, token: CancellationToken):
+        """设置取消标记；取消后流水线在下一个检查点抛出 GenerationCancelled"""
+        self.cancel_token = token
+
+    def _tick(self, done: int):
+        # 分块/事件粒度的检查点：先响应取消，再汇报进度
+        self.cancel_token.raise_if_cancelled()
+        self.progress.update(done)
+
     def analyze_events_for_manual_input(self) -> List[Dict[str, Any]]:
         """分析事件，找出需要手动输入的帝国名称和星神兽种类"""
         pending_entities = []
+        events = [e for tl in self.country_timelines for e in tl.events] or self.timeline_events
         
-        for event in self.timeline_events:
+        for event in events:
             # 分析需要帝国名称的事件
             template = self.event_descriptions.get(event.definition, "")
             placeholders = re.findall(r'\[([^\]]+)\]', template)
@@ -394,82 +1465,532 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
 
     def parse_save_file(self, path: str) -> bool:
         print(f"\n🔍 开始解析存档文件: {path}")
+        self.save_path = path
+        if self.save_index is None or self.save_index.path != path:
+            self.save_index = SaveIndex(path)
+        source = None
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            m = re.search(r'timeline_events\s*=\s*\{', content)
-            if not m:
+            with self.metrics.stage('read') as st:
+                source = self._open_save(path)
+                st.bytes = os.path.getsize(path)
+            with self.metrics.stage('extract') as st:
+                blocks = self._discover_timeline_blocks(source)
+                st.bytes = len(source)
+            if not blocks:
                 print("❌ 未找到timeline_events数据块")
                 return False
-            start = m.end() - 1
-            brace = 0; end = start
-            for i, ch in enumerate(content[start:], start):
-                if ch == '{': brace += 1
-                elif ch == '}':
-                    brace -= 1
-                    if brace == 0:
-                        end = i + 1
-                        break
-            block = content[start:end]
-            self._parse_timeline_events(block)
-            print(f"✅ 事件解析完成，共 {len(self.timeline_events)} 个")
+            if len(blocks) > 1:
+                print(f"🗺 发现 {len(blocks)} 个时间线块，所属国家: {', '.join(b.country for b in blocks)}")
+            selected = self._select_timelines(blocks)
+            if not selected:
+                print(f"❌ 存档中没有国家 {self.country_choice} 的时间线")
+                return False
+            with self.metrics.stage('parse') as st:
+                self._parse_timeline_events(source, selected)
+                st.bytes = sum(b.end - b.start for b in selected); st.events = sum(len(b.events) for b in selected)
+            self.country_timelines = selected
+            self.use_country_timeline(selected[0])
+            print(f"✅ 事件解析完成，共 {st.events} 个" + (f"（{len(selected)} 个国家）" if len(selected) > 1 else ''))
             return True
+        except GenerationCancelled:
+            raise
         except Exception as e:
             print(f"❌ 解析失败: {e}")
             return False
-
-    def _parse_timeline_events(self, text: str):
-        events = []
-        lines = text.split('\n')
-        current = None; brace = 0; in_event = False
-        for ln, line in enumerate(lines):
-            s = line.strip()
-            if not s: continue
-            brace += s.count('{') - s.count('}')
-            if not in_event and s == '{' and brace >= 2:
-                in_event = True; current = {'lines': [], 'start': ln}
-            elif in_event and current is not None:
-                current['lines'].append(s)
-                if s == '}' and brace == 1:
-                    evt_txt = '\n'.join(current['lines'])
-                    evt = self._parse_single_event(evt_txt)
-                    if evt: events.append(evt)
-                    in_event = False; current = None
-        events.sort(key=lambda e: e.date)
-        self.timeline_events = events
+        finally:
+            # keep_raw 时事件的原文区间引用着映射，不在此关闭：最后一个 RawSpan 被回收时映射随之释放
+            if isinstance(source, mmap.mmap) and not self.keep_raw:
+                source.close()
+
+    def _open_save(self, path: str):
+        """只读内存映射存档：结构扫描直接在字节上进行，不整体解码，重复运行可复用系统页缓存；
+        无法映射（如空文件）时退回整体读取解码"""
+        self.progress.start('read', os.path.getsize(path), 'bytes')
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return self._read_save_text(path)
+        self.progress.finish()
+        return mm
+
+    def _discover_timeline_blocks(self, buf) -> List[CountryTimeline]:
+        """一遍扫描找出全部 timeline_events 块及其所属国家：从 country 段起只匹配国家条目头与时间线头，
+        每个时间线块按括号配对跳到结尾后继续向后搜索，全文只过一遍；没有 country 段时只按时间线头搜索"""
+        P = self._patterns(buf)
+        self.progress.start('extract', len(buf), 'bytes')
+        cm = P.country.search(buf)
+        scan = P.owner if cm else P.timeline
+        pos = cm.end() if cm else 0
+        blocks: List[CountryTimeline] = []; owner = None
+        while True:
+            m = scan.search(buf, pos)
+            if not m: break
+            if m.lastindex:
+                owner = P.text(m.group(1)); pos = m.end(); continue
+            start = m.end() - 1
+            end = self._block_end(buf, start, P)
+            blocks.append(CountryTimeline(owner if owner is not None else f'#{len(blocks)}', start, end))
+            owner = None; pos = end
+            self._tick(end)
+        self.progress.finish()
+        return blocks
+
+    def _block_end(self, buf, start: int, P: EventPatterns) -> int:
+        """从 start 处的左括号按配对找到块尾（含右括号）；括号始终不配对（存档被截断）时取到文件末尾，尽量保住前面的事件"""
+        brace = 0
+        for n, bm in enumerate(P.brace.finditer(buf, start)):
+            if bm.lastindex: brace += 1
+            else:
+                brace -= 1
+                if brace == 0:
+                    return bm.end()
+            if n & 0xFFF == 0: self._tick(bm.start())
+        return len(buf)
+
+    def _select_timelines(self, blocks: List[CountryTimeline]) -> List[CountryTimeline]:
+        if self.country_choice == self.ALL_COUNTRIES:
+            return blocks
+        if not self.country_choice:
+            return blocks[:1]
+        return [b for b in blocks if b.country == self.country_choice][:1]
+
+    def set_country(self, country: str):
+        """选择生成哪个国家的编年史：国家 id、ALL_COUNTRIES（每个国家分别输出到子目录），空为第一个时间线块"""
+        self.country_choice = (country or '').strip()
+
+    def use_country_timeline(self, tl: CountryTimeline):
+        """切换到某个已解析国家的时间线，后续生成阶段都基于它"""
+        self.country = tl.country
+        self.timeline_events, self.skipped_list, self.filtered_counts = tl.events, tl.skipped, tl.filtered
+        self.skipped_events = len(tl.skipped)
+
+    @classmethod
+    def _patterns(cls, buf) -> EventPatterns:
+        return cls.STR_PATTERNS if isinstance(buf, str) else cls.BYTES_PATTERNS
+
+    def _read_save_text(self, path: str) -> str:
+        """分块读入预分配缓冲区后一次解码，按已读字节数汇报进度；除解码结果外只多占一份原始字节"""
+        size = os.path.getsize(path)
+        self.progress.start('read', size, 'bytes')
+        buf = bytearray(size); done = 0
+        t_us = self.metrics.tracer.now() if self.metrics.tracer else 0
+        with open(path, 'rb') as f, memoryview(buf) as view:
+            while done < size:
+                n = f.readinto(view[done:done + self.READ_CHUNK_SIZE])
+                if not n: break
+                done += n
+                t_us = self._trace_mark('read_chunk', t_us, bytes=n)
+                self._tick(done)
+        if done < size:
+            del buf[done:]
+        text = buf.decode('utf-8')
+        del buf
+        self.progress.finish()
+        return text.replace('\r\n', '\n') if '\r' in text else text
+
+    def _parse_timeline_events(self, buf, blocks: List[CountryTimeline]):
+        """解析 buf 中的各时间线块（buf 为 str 或内存映射的 bytes），结果写回各块：
+        总量足够大且允许多进程时所有块一起分块并行，否则逐块单进程扫描；两种方式结果完全一致"""
+        flt = self._effective_filter()
+        total = sum(b.end - b.start for b in blocks)
+        self.progress.start('parse', total, 'bytes')
+        workers = self._resolve_parse_workers(total)
+        parsed = None
+        if workers > 1:
+            try:
+                parsed = self._tokenize_parallel(buf, [(b.start, b.end) for b in blocks], flt, workers)
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                print(f"⚠ 并行解析失败，改为单进程解析: {e}")
+        if parsed is None:
+            parsed = []; base = 0
+            for b in blocks:
+                parsed.append(self._tokenize_sequential(buf, b.start, b.end, flt, base))
+                base += b.end - b.start
+        for b, (events, skipped, filtered) in zip(blocks, parsed):
+            b.events, b.skipped, b.filtered = events, skipped, filtered
+        self.progress.finish()
+        for b in blocks:
+            for date, definition in b.skipped[:self.SKIPPED_LOG_LIMIT]:
+                print(f"⚠ 跳过异常事件（国家 {b.country}）: 日期 {date} 代码 {definition}")
+            if len(b.skipped) > self.SKIPPED_LOG_LIMIT:
+                print(f"⚠ 国家 {b.country} 另有 {len(b.skipped) - self.SKIPPED_LOG_LIMIT} 个异常事件，完整列表见 生成统计.json")
+
+    def _raw_factory(self, buf) -> Callable[[int, int], Optional[RawSpan]]:
+        """keep_raw 时为事件生成原文区间；区间直接引用 buf，内存映射也只在访问某个事件时切出它自己的字节"""
+        if not self.keep_raw:
+            return lambda a, b: None
+        return lambda a, b: RawSpan(buf, a, b)
+
+    def set_keep_raw(self, keep: bool):
+        """保留事件原文区间：统计文件会附上未收录事件的原文样例，代价是事件释放前存档一直保持打开（内存映射时）或整份文本常驻（无法映射时）"""
+        self.keep_raw = keep
+
+    def set_parse_workers(self, workers: int):
+        """设置解析进程数：0 为自动（时间线块超过 PARALLEL_MIN_CHARS 时按 CPU 核数），1 为单进程"""
+        self.parse_workers = max(0, workers)
+
+    def _resolve_parse_workers(self, size: int) -> int:
+        if self.parse_workers == 1:
+            return 1
+        if self.parse_workers == 0:
+            return min(os.cpu_count() or 1, self.MAX_PARSE_WORKERS) if size >= self.PARALLEL_MIN_CHARS else 1
+        return self.parse_workers
+
+    def _tokenize_sequential(self, buf, start: int, end: int, flt: Optional[FilterSpec], base: int = 0):
+        """单进程扫描一个时间线块；base 为此前各块已解析的字符数（用于汇报进度）"""
+        t_us = self.metrics.tracer.now() if self.metrics.tracer else 0
+
+        def on_progress(pos: int, n_events: int):
+            nonlocal t_us
+            t_us = self._trace_mark('tokenize_chunk', t_us, braces=0x1000, events=n_events)
+            self._tick(base + pos - start)
+
+        # 单进程时直接构造 TimelineEvent，不经过中间元组
+        if self.keep_raw:
+            raw = self._raw_factory(buf)
+            make = lambda d, df, data, a, b: TimelineEvent(d, df, data, raw(a, b))
+        else:
+            make = lambda d, df, data, a, b: TimelineEvent(d, df, data)
+        parsed = self._tokenize(buf, start, end, 0, flt, on_progress, make)
+        self._trace_mark('tokenize_chunk', t_us, events=len(parsed[0]))
+        return parsed
+
+    def _tokenize_parallel(self, buf, spans: List[Tuple[int, int]], flt: Optional[FilterSpec], workers: int):
+        """各时间线块按事件边界切块后一起交给进程池（分块数与块大小成正比），返回每个块的解析结果；
+        各分块结果已按日期稳定排序，逐块归并后与单进程排序结果一致。
+        内存映射的存档只把文件路径与区间发给子进程，由子进程自行映射，不经进程间管道复制数据"""
+        import heapq
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+        from concurrent.futures.process import BrokenProcessPool
+        total = max(1, sum(e - s for s, e in spans))
+        chunks: List[Tuple[int, int, int, int]] = []  # (所属块, 起点, 终点, 起点处深度)
+        for k, (s, e) in enumerate(spans):
+            parts = max(1, round(workers * self.CHUNKS_PER_WORKER * (e - s) / total))
+            chunks += [(k, a, b, d) for a, b, d in self._split_timeline(buf, s, e, parts)]
+        mapped = isinstance(buf, mmap.mmap)
+        results: List[Any] = [None] * len(chunks)
+        pending = {}; nxt = 0; done_chars = 0
+        tracer = self.metrics.tracer
+        print(f"⚙ 并行解析: {len(chunks)} 块 / {workers} 进程")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_parse_worker_init) as pool:
+            try:
+                while nxt < len(chunks) or pending:
+                    # 最多同时投递 2×进程数 个分块，避免整份时间线一次性序列化进队列
+                    while nxt < len(chunks) and len(pending) < workers * 2:
+                        _, a, b, depth = chunks[nxt]
+                        if mapped:
+                            fut = pool.submit(_tokenize_file_range, self.save_path, a, b, depth, flt)
+                        else:
+                            fut = pool.submit(_tokenize_chunk, buf[a:b], a, depth, flt)
+                        pending[fut] = nxt
+                        nxt += 1
+                    finished, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        i = pending.pop(fut)
+                        events, skipped, filtered, pid, t0_ns, t1_ns = fut.result()
+                        results[i] = (events, skipped, filtered)
+                        _, a, b, _ = chunks[i]
+                        done_chars += b - a
+                        if tracer is not None:
+                            tracer.external('parse_chunk', t0_ns, t1_ns, pid, 'chunk', chunk=i, chars=b - a, events=len(events))
+                    self._tick(done_chars)
+            except BaseException as e:
+                for fut in pending: fut.cancel()
+                # 子进程被意外终止时若正在取消，按取消处理，不再退回单进程重新解析
+                if isinstance(e, BrokenProcessPool) and self.cancel_token.cancelled:
+                    raise GenerationCancelled() from e
+                raise
+        parsed = []
+        for k, (s, e) in enumerate(spans):
+            mine = [r for c, r in zip(chunks, results) if c[0] == k]
+            results = [None if c[0] == k else r for c, r in zip(chunks, results)]  # 归并后即释放中间元组
+            skipped = [x for r in mine for x in r[1]]
+            filtered: Dict[str, int] = {}
+            for r in mine:
+                for code, v in r[2].items(): filtered[code] = filtered.get(code, 0) + v
+            merged = heapq.merge(*(r[0] for r in mine), key=lambda ev: ev[0])
+            if self.keep_raw:
+                raw = self._raw_factory(buf)
+                events = [TimelineEvent(d, df, data, raw(a, b)) for d, df, data, a, b in merged]
+            else:
+                events = [TimelineEvent(d, df, data) for d, df, data, _, _ in merged]
+            parsed.append((events, skipped, filtered))
+            del mine, merged
+        return parsed
+
+    @classmethod
+    def _split_timeline(cls, buf, start: int, end: int, parts: int) -> List[Tuple[int, int, int]]:
+        """在括号深度 ≤1（事件之间）的位置切分 buf[start:end]，返回 [(起点, 终点, 起点处深度)]"""
+        P = cls._patterns(buf)
+        target = max(1, (end - start) // max(1, parts))
+        bounds = [(start, 0)]
+        while bounds[-1][0] + target < end:
+            prev, depth = bounds[-1]
+            p = prev + target
+            depth += P.depth_change(buf, prev, p)
+            if depth >= 2:
+                for bm in P.brace.finditer(buf, p, end):
+                    depth += 1 if bm.lastindex else -1
+                    if depth <= 1:
+                        p = bm.end(); break
+                else:
+                    break
+            bounds.append((p, depth))
+        return [(a, b, d) for (a, d), (b, _) in zip(bounds, bounds[1:] + [(end, 0)])]
+
+    @classmethod
+    def _tokenize(cls, text, start: int, end: int, depth: int, flt: Optional[FilterSpec],
+                  on_progress: Optional[Callable[[int, int], None]] = None, make: Optional[Callable] = None):
+        """按大括号深度扫描 text[start:end]（str 或 bytes/mmap）：第 2 层的 {...} 即一个事件，直接在原文上按区间匹配，不拆分行列表
+
+        depth 为起点处的括号深度（整块从 0 开始）；make(日期, 代码, data, 起, 止) 构造事件，缺省为元组（便于跨进程传回）。
+        返回 (按日期稳定排序的事件列表, 被跳过事件的 (日期, 代码) 列表, 过滤计数)
+        """
+        P = cls._patterns(text)
+        events = []; skipped: List[Tuple[str, str]] = []; filtered: Dict[str, int] = {}
+        ev_start = start
+        for n, bm in enumerate(P.brace.finditer(text, start, end)):
+            if on_progress is not None and n & 0xFFF == 0 and n:
+                on_progress(bm.start(), len(events))
+            if bm.lastindex:
+                depth += 1
+                if depth == 2: ev_start = bm.end()
+            else:
+                depth -= 1
+                if depth == 1:
+                    ev_end = bm.start()
+                    # 各正则都是线性的，超长但格式完整的事件照常解析，只跳过缺少日期/代码或 data 解析失败的事件
+                    header = cls._event_header(text, ev_start, ev_end, P)
+                    if header is None:
+                        skipped.append(cls._event_label(text, ev_start, ev_end, P)); continue
+                    if flt is not None and not flt.accepts(*header):
+                        filtered[header[1]] = filtered.get(header[1], 0) + 1; continue
+                    data = cls._parse_event_data(text, ev_start, ev_end, P)
+                    if data is None:
+                        skipped.append(header); continue
+                    events.append(make(header[0], header[1], data, ev_start, ev_end) if make
+                                  else (header[0], header[1], data, ev_start, ev_end))
+        events.sort(key=(lambda e: e.date) if make else (lambda e: e[0]))
+        return events, skipped, filtered
+
+    @classmethod
+    def _event_header(cls, text, start: int, end: int, P: Optional[EventPatterns] = None) -> Optional[Tuple[str, str]]:
+        """只读出事件的日期与代码（在原文上按区间匹配，不切片；bytes 只解码这两个值）"""
+        P = P or cls._patterns(text)
+        dm = P.date.search(text, start, end)
+        dfm = P.definition.search(text, start, end)
+        if not dm or not dfm: return None
+        return P.text(dm.group(1)), P.text(dfm.group(1))
+
+    @classmethod
+    def _event_label(cls, text, start: int, end: int, P: EventPatterns) -> Tuple[str, str]:
+        """读不全表头的事件也尽量给出日期与代码，缺的一项记为 "?"（用于异常事件日志）"""
+        dm = P.date.search(text, start, end)
+        dfm = P.definition.search(text, start, end)
+        return (P.text(dm.group(1)) if dm else '?'), (P.text(dfm.group(1)) if dfm else '?')
 
     def _parse_single_event(self, txt: str):
+        header = self._event_header(txt, 0, len(txt))
+        data = self._parse_event_data(txt, 0, len(txt)) if header else None
+        return TimelineEvent(header[0], header[1], data, RawSpan(txt, 0, len(txt))) if data is not None else None
+
+    @classmethod
+    def _parse_event_data(cls, text, start: int, end: int, P: Optional[EventPatterns] = None) -> Optional[Dict[str, Any]]:
+        P = P or cls._patterns(text)
         try:
-            dm = re.search(r'date\s*=\s*"([^"]+)"', txt)
-            dfm = re.search(r'definition\s*=\s*"([^"]+)"', txt)
-            if not dm or not dfm: return None
-            date = dm.group(1); definition = dfm.group(1)
             data = {}
-            dmatch = re.search(r'data\s*=\s*\{([^}]*)\}', txt, re.DOTALL)
+            dmatch = P.data.search(text, start, end)
             if dmatch:
                 body = dmatch.group(1).strip()
-                if re.match(r'^[\d\s]+$', body):
+                if P.numbers.fullmatch(body):
                     nums = [int(x) for x in body.split() if x.isdigit()]; data['numbers'] = nums
-                elif re.search(r'^\s*\d+\s*=', body, re.MULTILINE):
-                    pairs = re.findall(r'(\d+)\s*=\s*"([^"]*)"', body)
-                    data['items'] = [v for _, v in sorted(pairs, key=lambda x: int(x[0]))]
+                elif P.indexed.search(body):
+                    pairs = P.item.findall(body)
+                    data['items'] = [P.text(v) for _, v in sorted(pairs, key=lambda x: int(x[0]))]
                 else:
-                    kvs = re.findall(r'(\w+)\s*=\s*"([^"]*)"', body)
-                    for k,v in kvs: data[k]=v
-            return TimelineEvent(date=date, definition=definition, data=data, raw_text=txt)
+                    kvs = P.kv.findall(body)
+                    for k,v in kvs: data[P.text(k)]=P.text(v)
+            return data
         except Exception as e:
             print(f"⚠ 解析事件出错: {e}")
             return None
 
+    def run_pipeline(self, save_file: str, out_dir: str) -> bool:
+        """完整流程：解析 → 初版编年史 → 替换占位符 → 生成设定 → 保存；取消时抛出 GenerationCancelled"""
+        cancelled = False
+        try:
+            return self._run_stages(save_file, out_dir)
+        except GenerationCancelled:
+            cancelled = True
+            raise
+        finally:
+            if self.save_index is not None:
+                self.save_index.close()
+            if self.metrics.profiler is not None:
+                self.metrics.profiler.close()
+            if self.metrics.tracer is not None and not cancelled:
+                os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+                self.metrics.tracer.save(self.trace_path)
+                print(f"🧭 追踪已保存: {self.trace_path}")
+
+    def _run_stages(self, save_file: str, out_dir: str) -> bool:
+        if not self.parse_save_file(save_file):
+            print('❌ 解析失败，任务终止')
+            return False
+        if self.country_choice != self.ALL_COUNTRIES:
+            return self._generate_for_current(out_dir)
+        # 全部国家：逐个切换时间线，实体与阶段统计各自重新开始，输出到 "国家_<id>" 子目录
+        shared = len(self.metrics.stages)
+        for tl in self.country_timelines:
+            self.cancel_token.raise_if_cancelled()
+            print(f"\n🏳 国家 {tl.country}: {len(tl.events)} 个事件")
+            self.use_country_timeline(tl)
+            self._reset_generated_entities()
+            self.metrics.rewind(shared)
+            self._generate_for_current(os.path.join(out_dir, f"国家_{tl.country}"))
+        return True
+
+    def _reset_generated_entities(self):
+        self.generated_entities = {}
+        self.entity_counters = {k: 0 for k in self.entity_counters}
+        self.unknown_leviathan_codes = {}
+
+    def _generate_for_current(self, out_dir: str) -> bool:
+        with self.metrics.stage('render') as st:
+            initial = self.generate_initial_chronicle()
+            st.events = len(self.timeline_events); st.bytes = len(initial)
+        with self.metrics.stage('substitute') as st:
+            final = self.generate_final_chronicle(initial)
+            st.events = len(self.generated_entities); st.bytes = len(final)
+        del initial
+        with self.metrics.stage('settings') as st:
+            entities = self.generate_entities_settings_file()
+            st.events = len(self.generated_entities); st.bytes = len(entities)
+        self.save_chronicle_files(final, entities, out_dir)
+        return True
+
+    def detect_eras(self, events: List[TimelineEvent]) -> List[Era]:
+        """一遍扫描把时间线切成纪元：本章跨越 ERA_MIN_YEARS 年后，遇到首次出现的里程碑事件，
+        或最近 ERA_WINDOW_YEARS 年的事件密度与本章平均相差 ERA_DENSITY_RATIO 倍时另起一章；
+        密度变化的新章从窗口内变化开始处起算。窗口是非年度标记事件序列上的下标区间，候选分点按前后事件数 O(1) 评分；
+        某次评估找不到新分点时记下已评估到的位置，之后只评估新进入窗口的事件，总体仍是线性。年度标记不计入密度"""
+        titles = {}
+        for d, desc in self.event_descriptions.items():
+            parts = desc.split('_')
+            if len(parts) > 2 and parts[2] == '里程碑':
+                titles[d] = parts[0]
+        min_days = self.ERA_MIN_YEARS * DAYS_PER_YEAR; win = self.ERA_WINDOW_YEARS * DAYS_PER_YEAR; ratio = self.ERA_DENSITY_RATIO
+        starts: List[Tuple[int, str, str]] = [(0, self.ERA_TITLES['start'], 'start')]
+        ords: List[int] = []; idx: List[int] = []  # 非年度标记事件的日期序数与下标，窗口为 [lo, len(ords))
+        lo = 0; scanned = 0  # scanned 之前的候选分点已评估过且未能分章
+        seen: Set[str] = set()
+        chap_ord = -1; chap_events = 0
+        for i, ev in enumerate(events):
+            o = date_to_ordinal(ev.date)
+            if o < 0: continue
+            if chap_ord < 0: chap_ord = o
+            d = ev.definition
+            if d in titles and d not in seen:
+                seen.add(d)
+                if o - chap_ord >= min_days and i > starts[-1][0]:
+                    starts.append((i, titles[d], 'milestone'))
+                    lo = len(ords); chap_ord = o; chap_events = 0
+            if d == 'timeline_event_year': continue
+            ords.append(o); idx.append(i); chap_events += 1
+            while ords[lo] <= o - win: lo += 1
+            age = o - chap_ord
+            if age < min_days: continue
+            hi = len(ords)
+            recent = (hi - lo) / win; average = chap_events / age
+            if recent >= average * ratio or recent * ratio <= average:
+                surge = recent >= average * ratio
+                # 在窗口内找变化真正开始的事件：其后与其前的密度之比最大（骤增）或最小（骤减），跨度至少按一年计
+                best = lo; best_score = None; o_lo = ords[lo]
+                for k in range(max(lo + 1, scanned), hi):
+                    ok = ords[k]
+                    score = (hi - k) / max(o - ok, DAYS_PER_YEAR) / ((k - lo) / max(ok - o_lo, DAYS_PER_YEAR))
+                    if best_score is None or (score > best_score if surge else score < best_score):
+                        best, best_score = k, score
+                if idx[best] > starts[-1][0]:
+                    kind = 'surge' if surge else 'lull'
+                    starts.append((idx[best], self.ERA_TITLES[kind], kind))
+                    lo = best; chap_ord = ords[best]; chap_events = hi - best
+                else:
+                    scanned = hi
+        eras = []
+        for k, (i, title, reason) in enumerate(starts):
+            end = starts[k + 1][0] if k + 1 < len(starts) else len(events)
+            if end > i:
+                eras.append(Era(title, i, end, events[i].date, events[end - 1].date, reason))
+        return eras
+
     def generate_initial_chronicle(self) -> str:
         lines = ["="*60, "群星帝国编年史", "="*60, ""]
+        chunks: List[str] = []
         filtered = 0
-        for ev in self.timeline_events:
-            if not self.include_year_markers and ev.definition == 'timeline_event_year':
+        stats = self.event_stats = EventStats()
+        by_def, by_year, unknown = stats.by_definition, stats.by_year, stats.unknown
+        descriptions = self.event_descriptions
+        self.eras = self.detect_eras(self.timeline_events) if self.chapters else []
+        headers = {era.start: (n, era) for n, era in enumerate(self.eras, 1)}
+        # 分片时记录各分片的起始行与偏移：done_lines / done_chars 为已拼入 chunks 的行数与字符数
+        shard_by = self.shard_by if self.timeline_events else ''
+        self.shards = shards = []; self.year_lines = year_lines = {}
+        done_lines = 0; done_chars = 0; key = None; cur: Optional[ChronicleShard] = None
+        def open_shard(label: str, date: str) -> ChronicleShard:
+            shard = ChronicleShard(label, done_lines + len(lines), done_chars + sum(len(l) + 1 for l in lines), date)
+            shards.append(shard)
+            return shard
+        def header(n: int, era: Era) -> List[str]:
+            # 除第一章外，标题前空一行
+            return [""] * (n > 1) + [f"【第{n}章】{era.title}（{era.start_date} ~ {era.end_date}，{era.end - era.start} 条）", ""]
+        # 章标题等到章内第一条输出的事件再写：先按该事件切换分片，标题总落在它所在分片的开头
+        pending: Optional[Tuple[int, Era]] = None
+        self.progress.start('render', len(self.timeline_events), 'events')
+        for i, ev in enumerate(self.timeline_events):
+            if i & 0x3F == 0: self._tick(i)
+            if i in headers:
+                if pending is not None:  # 上一章的事件全被过滤，标题照常保留
+                    lines += header(*pending)
+                pending = headers[i]
+            d = ev.definition
+            by_def[d] = by_def.get(d, 0) + 1
+            y = ev.date.partition('.')[0]
+            by_year[y] = by_year.get(y, 0) + 1
+            if d not in descriptions:
+                if d not in unknown: stats.unknown_samples[d] = ev
+                unknown[d] = unknown.get(d, 0) + 1
+            if not self.include_year_markers and d == 'timeline_event_year':
                 filtered += 1; continue
+            if pending is not None and pending[0] > 1:
+                lines.append("")  # 空行留在上一分片末尾
+            if shard_by == 'century':
+                k = int(y) // 100 if y.isdigit() else key
+                if cur is None or k != key:
+                    key = k; cur = open_shard(f"{k * 100}-{k * 100 + 99}" if k is not None else y, ev.date)
+            elif shard_by and shard_by != 'chapter' and (i - filtered) % shard_by == 0:
+                cur = open_shard(ev.date, ev.date)
+            if pending is not None:
+                if shard_by == 'chapter': cur = open_shard(pending[1].title, ev.date)
+                lines += header(*pending)[pending[0] > 1:]; pending = None
+            if shard_by:
+                if cur is None: cur = open_shard(ev.date, ev.date)
+                cur.events += 1; cur.end_date = ev.date
+                if y not in year_lines: year_lines[y] = done_lines + len(lines)
             lines.append(f"{ev.date} - {self._convert_event_to_text(ev)}")
-        print(f"✅ 初版编年史生成完成，共 {len(self.timeline_events)-filtered} 条")
-        return '\n'.join(lines)
+            if len(lines) >= self.RENDER_BATCH:
+                chunk = '\n'.join(lines); chunks.append(chunk)
+                done_lines += len(lines); done_chars += len(chunk) + 1; lines = []
+        if pending is not None:
+            lines += header(*pending)
+        if lines or not chunks:
+            chunks.append('\n'.join(lines))
+        self.progress.finish()
+        print(f"✅ 初版编年史生成完成，共 {len(self.timeline_events)-filtered} 条" + (f"，分 {len(self.eras)} 章" if self.eras else ""))
+        return '\n'.join(chunks)
 
     def _convert_event_to_text(self, ev: TimelineEvent) -> str:
         if ev.definition not in self.event_descriptions:
@@ -479,6 +2000,10 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
         fmt_args: Dict[str, Any] = {'date': ev.date, **ev.data}
         formatter = string.Formatter()
         needed = [f for _,f,_,_ in formatter.parse(template) if f]
+        for f, v in self._entity_name_args(ev, needed).items():
+            fmt_args.setdefault(f, v)
+        # data 中带国家 id 且存档里有该国时，帝国占位符按国家 id 命名，同一国家在全书中只对应一个实体
+        country = self._event_country(ev) if any(f.endswith('_empire') for f in needed) else None
         for f in needed:
             if f not in fmt_args:
                 defaults = {
@@ -499,6 +2024,8 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
                     fmt_args[f] = self._get_leviathan_name(ev.data)
                 elif f in defaults:
                     fmt_args[f] = defaults[f]
+                elif f.endswith('_empire') and country:
+                    fmt_args[f] = country
                 elif f.endswith('_empire'):
                     fmt_args[f] = f"帝国{len(self.generated_entities)+1}"
                 elif f.endswith('_fallen_empire'):
@@ -525,6 +2052,46 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
         if ph.startswith('种族'): return self._generate_species(ph, ev)
         return None
 
+    def _entity_name_args(self, ev: TimelineEvent, needed: List[str]) -> Dict[str, str]:
+        """把 data 中的星球/星系/领袖/舰队/舰船 id 换成存档里的真实名称；没有星系 id 时取星球所在星系"""
+        wanted = [f for f in needed if f in self.NAME_FIELDS]
+        if not wanted or self.save_index is None:
+            return {}
+        ids = {kind: ev.data.get(kind) for kind in {self.NAME_FIELDS[f] for f in wanted}}
+        try:
+            if 'system' in ids and ids['system'] is None and ev.data.get('planet') is not None:
+                ids['system'] = self.save_index.planet_system(ev.data['planet'])
+            names = {kind: self.save_index.entity_name(kind, i) for kind, i in ids.items() if i is not None}
+        except (OSError, ValueError):
+            return {}  # 存档已不可读时沿用默认值
+        return {f: names[self.NAME_FIELDS[f]] for f in wanted if names.get(self.NAME_FIELDS[f])}
+
+    def _event_country(self, ev: TimelineEvent) -> Optional[str]:
+        """帝国类事件的 data 为 "0 <国家 id>"；存档中确有该国时返回其 id"""
+        nums = ev.data.get('numbers')
+        if not nums or len(nums) < 2 or self.save_index is None:
+            return None
+        cid = str(nums[-1])
+        return cid if self._country_info(cid) is not None else None
+
+    def _country_info(self, cid: str) -> Optional[CountryInfo]:
+        if self.save_index is None or not cid.isdigit():
+            return None
+        try:
+            return self.save_index.country(cid)
+        except (OSError, ValueError):
+            return None  # 存档已不可读（被移动、为空）时退回随机生成
+
+    def _translate_ethics(self, keys: List[str]) -> List[str]:
+        names = self.empire_generation_data['ethic_keys']
+        out = []
+        for k in keys:
+            base = k[len('ethic_'):] if k.startswith('ethic_') else k
+            fanatic = base.startswith('fanatic_')
+            name = names.get(base[len('fanatic_'):] if fanatic else base)
+            if name: out.append(('极端' if fanatic else '') + name)
+        return out
+
     def _weighted_random(self, items: List[Dict[str, Any]]):
         total = sum(i['weight'] for i in items); r = random.randint(1,total); cur=0
         for it in items:
@@ -544,18 +2111,28 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
             name_options = self.empire_generation_data['name_lists'][portrait['name']]
             empire_name = random.choice(name_options) + f"第{self.entity_counters['empire']}共同体"
         
-        # 其他属性仍然随机生成
+        # 存档中能找到该国时用真实的名称、思潮与政体，其余属性仍然随机生成
+        info = self._country_info(ph[len('帝国'):])
+        if info is not None and info.name and not (self.generation_mode == "manual" and ph in self.manual_empire_names):
+            empire_name = info.name
         portrait = self._weighted_random(self.empire_generation_data['portraits'])
-        ethics = self._generate_ethics(None)
-        authority = self._select_authority(ethics)
+        ethics = (self._translate_ethics(info.ethics) if info else []) or self._generate_ethics(None)
+        authority = (self.empire_generation_data['authority_keys'].get(info.authority) if info else None) or self._select_authority(ethics)
         traits = self._generate_traits()
         props = {'name':empire_name,'species':f"{portrait['name']}种族{self.entity_counters['empire']}", 'portrait':portrait['name'], 'ethics':ethics, 'authority':authority,'traits':traits,'personality':self._generate_personality(ethics),'type':'ai_empire'}
+        if info is not None:
+            props['country_id'] = info.country_id
         return GeneratedEntity('empire', empire_name, props, ph)
 
     def _generate_fallen_empire(self, ph: str, ev: TimelineEvent) -> GeneratedEntity:
         cfg = random.choice(self.empire_generation_data['fallen_empires'])
-        props = {'name':cfg['name'],'species':cfg['species'],'type_name':cfg['type'],'ethics':cfg['ethics'],'personality':cfg['personality'],'type':'fallen_empire'}
-        return GeneratedEntity('fallen_empire', cfg['name'], props, ph)
+        info = self._country_info(ph[len('堕落帝国'):])
+        name = (info.name if info else None) or cfg['name']
+        ethics = (self._translate_ethics(info.ethics) if info else []) or cfg['ethics']
+        props = {'name':name,'species':cfg['species'],'type_name':cfg['type'],'ethics':ethics,'personality':cfg['personality'],'type':'fallen_empire'}
+        if info is not None:
+            props['country_id'] = info.country_id
+        return GeneratedEntity('fallen_empire', name, props, ph)
 
     def _generate_species(self, ph: str, ev: TimelineEvent) -> GeneratedEntity:
         self.entity_counters['species'] += 1
@@ -615,15 +2192,34 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
         return '谨慎的帝国主义者'
 
     def generate_final_chronicle(self, initial: str) -> str:
-        out = initial
-        for ph, ent in self.generated_entities.items():
-            out = re.sub(rf'\[{re.escape(ph)}\]', ent.name, out)
-        out = re.sub(r'\[玩家帝国\]', self.player_empire_name, out)
+        names = {ph: ent.name for ph, ent in self.generated_entities.items()}
+        names['玩家帝国'] = self.player_empire_name
+        replace = lambda m: names.get(m.group(1), m.group(0))
+        self.progress.start('substitute', len(initial), 'bytes')
+        # 按行边界分段、每段单次扫描替换全部占位符：不再逐实体复制整份文本，
+        # 中间片段也只存在于当前段内（占位符不跨行，分段不影响结果）
+        # 分片起点也作为分段边界（都在行首），顺带得到各分片在最终文本中的偏移
+        parts: List[str] = []; pos = 0; done = 0; k = 0; shards = self.shards
+        while pos < len(initial):
+            if k < len(shards) and shards[k].offset <= pos:
+                shards[k].final_offset = done; k += 1; continue
+            end = initial.find('\n', pos + self.SUBSTITUTE_SEGMENT)
+            end = len(initial) if end < 0 else end + 1
+            if k < len(shards) and shards[k].offset < end:
+                end = shards[k].offset
+            parts.append(self.PLACEHOLDER_RE.sub(replace, initial[pos:end]))
+            done += len(parts[-1])
+            pos = end
+            self._tick(pos)
+        out = ''.join(parts)
+        del parts
+        self.progress.finish()
         print(f"✅ 占位符替换完成，共替换 {len(self.generated_entities)} 个实体")
         return out
 
     def generate_entities_settings_file(self) -> str:
         from datetime import datetime as _dt
+        self.progress.start('settings', len(self.generated_entities), 'events')
         lines = ["="*60, "群星帝国编年史 - 动态生成实体设定", "="*60, "", f"生成时间: {_dt.now().strftime('%Y-%m-%d %H:%M:%S')}", f"总计生成实体: {len(self.generated_entities)} 个", ""]
         groups: Dict[str, List[GeneratedEntity]] = {}
         for ent in self.generated_entities.values():
@@ -633,61 +2229,243 @@ class StellarisChronicleGenerator:  # 精简自 v0.03，逻辑保持一致
             lines.append(f"## {type_names.get(t, t)} ({len(ents)}个)")
             lines.append("")
             for ent in ents:
-                lines.append(f"### {ent.name}")
-                lines.append(f"- 占位符: [{ent.placeholder_id}]")
+                # 每个实体先拼成一段再入列表，避免数十万个短行对象
+                block = [f"### {ent.name}"]
+                block.append(f"- 占位符: [{ent.placeholder_id}]")
+                if 'country_id' in ent.properties:
+                    block.append(f"- 存档国家 ID: {ent.properties['country_id']}（名称、思潮与政体取自存档）")
                 if t=='empire':
-                    lines.append(f"- 种族: {ent.properties['species']}")
-                    lines.append(f"- 肖像: {ent.properties['portrait']}")
-                    lines.append(f"- 思潮: {', '.join(ent.properties['ethics'])}")
-                    lines.append(f"- 政体: {ent.properties['authority']}")
-                    lines.append(f"- 特质: {', '.join(ent.properties['traits'])}")
-                    lines.append(f"- 性格: {ent.properties['personality']}")
+                    block.append(f"- 种族: {ent.properties['species']}")
+                    block.append(f"- 肖像: {ent.properties['portrait']}")
+                    block.append(f"- 思潮: {', '.join(ent.properties['ethics'])}")
+                    block.append(f"- 政体: {ent.properties['authority']}")
+                    block.append(f"- 特质: {', '.join(ent.properties['traits'])}")
+                    block.append(f"- 性格: {ent.properties['personality']}")
                 elif t=='fallen_empire':
-                    lines.append(f"- 种族: {ent.properties['species']}")
-                    lines.append(f"- 类型: {ent.properties['type_name']}")
-                    lines.append(f"- 思潮: {', '.join(ent.properties['ethics'])}")
-                    lines.append(f"- 性格: {ent.properties['personality']}")
+                    block.append(f"- 种族: {ent.properties['species']}")
+                    block.append(f"- 类型: {ent.properties['type_name']}")
+                    block.append(f"- 思潮: {', '.join(ent.properties['ethics'])}")
+                    block.append(f"- 性格: {ent.properties['personality']}")
                 elif t=='species':
-                    lines.append(f"- 肖像: {ent.properties['portrait']}")
-                    lines.append(f"- 特质: {', '.join(ent.properties['traits'])}")
-                lines.append("")
+                    block.append(f"- 肖像: {ent.properties['portrait']}")
+                    block.append(f"- 特质: {', '.join(ent.properties['traits'])}")
+                block.append("")
+                lines.append('\n'.join(block))
+        self.progress.finish()
         return '\n'.join(lines)
 
     def save_chronicle_files(self, final_txt: str, settings_txt: str, out_dir: str):
         os.makedirs(out_dir, exist_ok=True)
+        self.progress.start('save', len(final_txt) * (2 if self.shards else 1) + len(settings_txt), 'bytes')
         chron = os.path.join(out_dir, "群星帝国编年史.txt")
-        with open(chron, 'w', encoding='utf-8') as f: f.write(final_txt)
-        print(f"✅ 编年史已保存: {chron}")
         setting = os.path.join(out_dir, "动态生成实体设定.md")
-        with open(setting, 'w', encoding='utf-8') as f: f.write(settings_txt)
-        print(f"✅ 实体设定已保存: {setting}")
         stats = os.path.join(out_dir, "生成统计.txt")
-        self._save_stats(stats)
-        print(f"✅ 生成统计已保存: {stats}")
+        stats_json = os.path.join(out_dir, "生成统计.json")
+        shard_dir = os.path.join(out_dir, self.CHAPTER_DIR if self.shard_by == 'chapter' else self.SHARD_DIR) if self.shards else ''
+        # 先写入临时文件，全部成功后再统一改名；取消或出错时不留下半成品
+        pending = [chron, setting, stats, stats_json] + ([shard_dir] if shard_dir else [])
+        try:
+            with self.metrics.stage('save') as st:
+                self._write_text(chron + '.part', final_txt, 0)
+                self._write_text(setting + '.part', settings_txt, len(final_txt))
+                if shard_dir:
+                    self._write_shards(shard_dir + '.part', final_txt, len(final_txt) + len(settings_txt))
+                st.bytes = len(final_txt) * (2 if shard_dir else 1) + len(settings_txt)
+            self._save_stats(stats + '.part')
+            self._save_stats_json(stats_json + '.part')
+            self.cancel_token.raise_if_cancelled()
+        except BaseException:
+            for p in pending:
+                if os.path.isdir(p + '.part'): shutil.rmtree(p + '.part')
+                elif os.path.exists(p + '.part'): os.remove(p + '.part')
+            raise
+        for p in pending:
+            if os.path.isdir(p): shutil.rmtree(p)  # 上次的分片目录，分片数可能不同
+            os.replace(p + '.part', p)
+        self.progress.finish()
+        print(f"✅ 编年史已保存: {chron}")
+        print(f"✅ 实体设定已保存: {setting}")
+        print(f"✅ 生成统计已保存: {stats}（性能数据: {os.path.basename(stats_json)}）")
+        if shard_dir:
+            print(f"✅ 分片编年史已保存: {shard_dir}（{len(self.shards)} 个文件，索引 {self.SHARD_INDEX}）")
+
+    def _write_shards(self, folder: str, final_txt: str, offset: int):
+        """按渲染时记录的分片起点切分最终编年史，用线程池并发编码写出（编年史标题只留在完整文件中），
+        并写出索引：各分片的日期范围、事件数与行数，以及每个年份所在的分片与分片内行号"""
+        from bisect import bisect_right
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        if os.path.isdir(folder): shutil.rmtree(folder)
+        os.makedirs(folder)
+        shards = self.shards
+        width = max(2, len(str(len(shards))))
+        names = [f"第{n:0{width}d}章_{sh.label}" if self.shard_by == 'chapter' else f"{n:0{width}d}_{sh.label}"
+                 for n, sh in enumerate(shards, 1)]
+        names = [re.sub(r'[\\/:*?"<>|\s]', '_', n) + '.txt' for n in names]
+        ends = [sh.final_offset for sh in shards[1:]] + [len(final_txt)]
+        total_lines = final_txt.count('\n') + 1
+
+        def write(k: int) -> int:
+            self.cancel_token.raise_if_cancelled()
+            text = final_txt[shards[k].final_offset:ends[k]].rstrip('\n') + '\n'
+            with open(os.path.join(folder, names[k]), 'w', encoding='utf-8') as f:
+                f.write(text)
+            return len(text)
+
+        done = offset - len(final_txt)
+        with ThreadPoolExecutor(max_workers=min(self.MAX_WRITE_WORKERS, len(shards))) as pool:
+            for fut in as_completed([pool.submit(write, k) for k in range(len(shards))]):
+                done += fut.result()
+                self._tick(done)
+        starts = [sh.line for sh in shards]
+        index = {
+            'chronicle': '群星帝国编年史.txt', 'shard_by': self.shard_by,
+            'shards': [{'file': names[k], 'start_date': sh.start_date, 'end_date': sh.end_date, 'events': sh.events,
+                        'chronicle_line': sh.line + 1,
+                        'lines': (starts[k + 1] if k + 1 < len(shards) else total_lines) - sh.line}
+                       for k, sh in enumerate(shards)],
+            # 行号均从 1 起：line 为分片文件内的行号，chronicle_line 为完整编年史中的行号
+            'years': {y: {'shard': (k := bisect_right(starts, ln) - 1), 'file': names[k], 'line': ln - starts[k] + 1,
+                          'chronicle_line': ln + 1}
+                      for y, ln in sorted(self.year_lines.items(), key=lambda kv: EventStats._year_key(kv[0]))},
+        }
+        with open(os.path.join(folder, self.SHARD_INDEX), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+
+    def _write_text(self, path: str, text: str, offset: int):
+        """分块写出文本，offset 为本文件之前已写出的字符数（用于汇报进度）"""
+        step = self.WRITE_CHUNK_CHARS
+        t_us = self.metrics.tracer.now() if self.metrics.tracer else 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for i in range(0, len(text), step):
+                f.write(text[i:i + step])
+                self._tick(offset + i + step)
+        self._trace_mark('write_file', t_us, file=os.path.basename(path), chars=len(text))
 
     def _save_stats(self, path: str):
         from datetime import datetime as _dt
-        year_markers = sum(1 for e in self.timeline_events if e.definition=='timeline_event_year')
-        lines = ["="*40, "群星帝国编年史生成统计", "="*40, "", f"解析时间: {_dt.now().strftime('%Y-%m-%d %H:%M:%S')}", f"总事件数: {len(self.timeline_events)}"]
+        stats = self.event_stats
+        year_markers = stats.by_definition.get('timeline_event_year', 0) + self.filtered_counts.get('timeline_event_year', 0)
+        total = len(self.timeline_events) + sum(self.filtered_counts.values())
+        lines = ["="*40, "群星帝国编年史生成统计", "="*40, "", f"解析时间: {_dt.now().strftime('%Y-%m-%d %H:%M:%S')}", f"总事件数: {total}"]
+        if len(self.country_timelines) > 1 or self.country_choice:
+            lines.insert(5, f"国家 ID: {self.country}")
         if self.include_year_markers:
             lines.append(f"年度标记事件: {year_markers} (已包含)")
         else:
             lines.append(f"年度标记事件: {year_markers} (已过滤)")
+        other_filtered = sum(n for d, n in self.filtered_counts.items() if d != 'timeline_event_year')
+        if other_filtered:
+            lines.append(f"按过滤条件跳过: {other_filtered}")
+        if self.skipped_events:
+            lines.append(f"跳过的异常事件: {self.skipped_events} (缺少日期/代码或 data 无法解析)")
         
         # 添加未知星神兽代码的提示
         if self.unknown_leviathan_codes:
             lines.append("")
             lines.append("发现未知星神兽代码:")
             lines.append("="*25)
-            for code in sorted(self.unknown_leviathan_codes):
-                lines.append(f"- {code}")
+            for code, n in sorted(self.unknown_leviathan_codes.items(), key=lambda kv: (-kv[1], kv[0])):
+                lines.append(f"- {code}: {n} 次")
             lines.append("")
             lines.append("这些代码对应的星神兽名称尚未收录，欢迎提交反馈！")
             lines.append("请访问项目GitHub页面反馈这些未知代码对应的星神兽名称。")
+
+        lines.extend(self._unknown_event_report())
+        lines.extend(self._distribution_report())
+
+        if self.metrics.stages:
+            lines.append("")
+            lines.append("各阶段耗时与吞吐:")
+            lines.append("="*25)
+            lines.extend(self.metrics.report_lines())
         
         lines.append("")
         with open(path, 'w', encoding='utf-8') as f: f.write('\n'.join(lines))
 
+    def _unknown_event_report(self, sample_chars: int = 400) -> List[str]:
+        """未收录事件代码及数量；开启 keep_raw 时附每种代码第一条事件的原文"""
+        stats = self.event_stats
+        if not stats.unknown:
+            return []
+        lines = ["", "未收录事件代码:", "="*25]
+        for code, n in sorted(stats.unknown.items(), key=lambda kv: -kv[1]):
+            lines.append(f"- {code}: {n} 条")
+            sample = stats.unknown_samples[code]
+            if sample.raw is not None:
+                raw = sample.raw_text.strip()
+                if len(raw) > sample_chars: raw = raw[:sample_chars] + ' ...'
+                lines.extend('    ' + ln.strip() for ln in raw.splitlines() if ln.strip())
+        if not self.keep_raw:
+            lines.append("（命令行加 --keep-raw 可附上这些事件的原文样例）")
+        lines.append("欢迎将这些代码与原文样例反馈到项目GitHub页面。")
+        return lines
+
+    def _distribution_report(self) -> List[str]:
+        """各事件代码条数与按年代/年份的分布（被过滤的事件只计入代码条数）"""
+        stats = self.event_stats
+        counts = dict(stats.by_definition)
+        for d, n in self.filtered_counts.items():
+            counts[d] = counts.get(d, 0) + n
+        if not counts:
+            return []
+        lines = ["", "事件代码分布:", "="*25]
+        lines.extend(f"- {d}: {n}" + (f"（过滤 {self.filtered_counts[d]}）" if d in self.filtered_counts else '')
+                     for d, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+        decades = stats.decades()
+        if decades:
+            lines += ["", "按年代分布:", "="*25]
+            lines.extend(f"- {d}s: {n} | " + ' '.join(f"{y}:{c}" for y, c in ys) for d, n, ys in decades)
+        return lines
+
+    def _save_stats_json(self, path: str):
+        """机器可读的性能统计附件，便于用户反馈慢速存档时直接附上"""
+        from datetime import datetime as _dt
+        save_bytes = os.path.getsize(self.save_path) if self.save_path and os.path.isfile(self.save_path) else 0
+        data = {
+            'version': VERSION,
+            'generated_at': _dt.now().isoformat(timespec='seconds'),
+            'save_file': os.path.basename(self.save_path),
+            'save_bytes': save_bytes,
+            'country': self.country,
+            'total_events': len(self.timeline_events) + sum(self.filtered_counts.values()),
+            'filtered_events': dict(sorted(self.filtered_counts.items())),
+            'skipped_events': self.skipped_events,
+            'skipped_event_list': [{'date': d, 'definition': df} for d, df in self.skipped_list],
+            'include_year_markers': self.include_year_markers,
+            'chapters': [{'title': e.title, 'reason': e.reason, 'start_date': e.start_date, 'end_date': e.end_date,
+                          'events': e.end - e.start} for e in self.eras],
+            'event_stats': dict(self.event_stats.to_dict(), unknown_leviathans=dict(
+                sorted(self.unknown_leviathan_codes.items(), key=lambda kv: (-kv[1], kv[0])))),
+            'total_wall_s': round(self.metrics.total_wall(), 6),
+            'profiled': self.metrics.profiler is not None,
+            'stages': [r.to_dict() for r in self.metrics.stages],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+def _parse_worker_init():
+    """解析进程池的初始化函数：子进程忽略 SIGINT。终端 Ctrl+C 会发给整个进程组，
+    取消只由主进程的取消标记处理，子进程不能因此中断（spawn 时会抛 KeyboardInterrupt 弄坏进程池，fork 时会继承主进程的处理函数）"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _tokenize_chunk(chunk: str, offset: int, depth: int, flt: Optional[FilterSpec]):
+    """进程池工作函数（需位于模块顶层才能被 pickle）：扫描一个分块，事件区间换算回整块偏移"""
+    t0 = time.perf_counter_ns()
+    events, skipped, filtered = StellarisChronicleGenerator._tokenize(chunk, 0, len(chunk), depth, flt)
+    if offset:
+        events = [(d, df, data, a + offset, b + offset) for d, df, data, a, b in events]
+    return events, skipped, filtered, os.getpid(), t0, time.perf_counter_ns()
+
+def _tokenize_file_range(path: str, start: int, end: int, depth: int, flt: Optional[FilterSpec]):
+    """进程池工作函数：子进程自行只读映射存档，只扫描分到的区间，事件区间本就是文件偏移"""
+    t0 = time.perf_counter_ns()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        events, skipped, filtered = StellarisChronicleGenerator._tokenize(mm, start, end, depth, flt)
+    return events, skipped, filtered, os.getpid(), t0, time.perf_counter_ns()
+
+StellarisChronicleGenerator.STR_PATTERNS = EventPatterns(False)
+StellarisChronicleGenerator.BYTES_PATTERNS = EventPatterns(True)
+
 # === 内嵌核心生成器结束 ===
 
 
@@ -699,6 +2477,7 @@ class GuiLogger:
         self._stopping = False
         self._orig_stdout = sys.stdout
         self._orig_stderr = sys.stderr
+        self.tracer: Optional[TraceRecorder] = None  # 开启追踪时记录每次日志刷新
 
     def write(self, data: str):
         if not data:
@@ -718,12 +2497,18 @@ class GuiLogger:
     def _poll(self, root: 'ctk.CTk'):
         if self._stopping:
             return
+        tracer = self.tracer
+        t_us = tracer.now() if tracer else 0
+        n = 0
         try:
             while True:
                 line = self.queue.get_nowait()
                 self._append_colored(line)
+                n += 1
         except queue.Empty:
             pass
+        if tracer and n:
+            tracer.complete('gui_log_flush', t_us, 'gui', lines=n)
         root.after(80, lambda: self._poll(root))
 
     def _append_colored(self, line: str):
@@ -989,10 +2774,16 @@ class ModernGUI:
         self.empire_name = ctk.StringVar()
         self.output_dir = ctk.StringVar()
         self.include_year = ctk.BooleanVar(value=True)
+        self.chapter_mode = ctk.BooleanVar(value=False)
+        self.split_chapter_mode = ctk.BooleanVar(value=False)
+        self.country_choice = ctk.StringVar()
+        self.profile_mode = ctk.BooleanVar(value=False)
+        self.trace_mode = ctk.BooleanVar(value=False)
         self.current_step = ctk.StringVar(value='就绪')
         self.progress_value = 0
 
         self.running_thread: Optional[threading.Thread] = None
+        self.cancel_token: Optional[CancellationToken] = None
         self._last_success: Optional[bool] = None
         self.logger: Optional[GuiLogger] = None
         self._spinner_phase = 0
@@ -1078,6 +2869,21 @@ class ModernGUI:
         sec3.pack(anchor='w', padx=14, pady=pady_block)
         chk_year = ctk.CTkCheckBox(parent, text='生成年度标记', variable=self.include_year)
         chk_year.pack(anchor='w', padx=22, pady=(0, 6))
+        def on_chapter_toggle():
+            # 逐章另存依附于分章，关闭分章时一并取消
+            if not self.chapter_mode.get():
+                self.split_chapter_mode.set(False)
+            chk_split.configure(state='normal' if self.chapter_mode.get() else 'disabled')
+        chk_chapter = ctk.CTkCheckBox(parent, text='按纪元分章', variable=self.chapter_mode, command=on_chapter_toggle)
+        chk_chapter.pack(anchor='w', padx=22, pady=(0, 6))
+        chk_split = ctk.CTkCheckBox(parent, text='每章另存一个文件', variable=self.split_chapter_mode, state='disabled')
+        chk_split.pack(anchor='w', padx=44, pady=(0, 6))
+        row_country = ctk.CTkFrame(parent, fg_color='transparent')
+        row_country.pack(fill='x', padx=22, pady=(0, 6))
+        ctk.CTkLabel(row_country, text='国家:').pack(side='left')
+        entry_country = ctk.CTkComboBox(row_country, variable=self.country_choice, width=120,
+                                        values=[StellarisChronicleGenerator.ALL_COUNTRIES])
+        entry_country.pack(side='left', padx=8)
 
         # 输出目录
         sec4 = ctk.CTkLabel(parent, text='4. 输出目录', font=ctk.CTkFont(size=14, weight='bold'))
@@ -1096,6 +2902,8 @@ class ModernGUI:
         run_row.pack(fill='x', padx=14, pady=(0,4))
         self.run_button = ctk.CTkButton(run_row, text='开始生成', command=self.start_generation, fg_color='#3d82f7', hover_color='#4d8dff')
         self.run_button.pack(side='left')
+        self.cancel_button = ctk.CTkButton(run_row, text='取消', width=60, command=self.cancel_generation, state='disabled', fg_color='#d9534f', hover_color='#c9302c')
+        self.cancel_button.pack(side='left', padx=(6, 0))
         self.open_dir_button = ctk.CTkButton(run_row, text='打开输出目录', command=self.open_output_dir, state='disabled')
         self.open_dir_button.pack(side='left', padx=6)
         self.clear_log_button = ctk.CTkButton(run_row, text='清空日志', command=self.clear_log, fg_color='#444c55')
@@ -1112,8 +2920,10 @@ class ModernGUI:
             (entry_save, '存档文件路径'),
             (entry_empire, '你的玩家帝国显示名称，可留空'),
             (chk_year, '是否生成每年的标记分隔'),
+            (entry_country, '多人/多国家存档: 填国家 id 只生成该国，选 all 为每个国家分别输出到子目录；留空=第一个时间线'),
             (btn_out, '选择保存输出文件的目录'),
             (self.run_button, '开始解析并生成编年史'),
+            (self.cancel_button, '中止正在运行的任务，不保留未完成的输出文件'),
             (self.open_dir_button, '任务成功后打开输出目录'),
             (self.clear_log_button, '清空右侧日志窗口'),
             (self.update_button, '从 GitHub 查询最新版本'),
@@ -1127,7 +2937,7 @@ class ModernGUI:
         self.progress_bar = ctk.CTkProgressBar(top_bar)
         self.progress_bar.pack(fill='x', expand=True, side='left')
         self.progress_bar.set(0)
-        self.step_label = ctk.CTkLabel(top_bar, textvariable=self.current_step, width=140, anchor='w')
+        self.step_label = ctk.CTkLabel(top_bar, textvariable=self.current_step, width=300, anchor='w')
         self.step_label.pack(side='left', padx=(10,0))
 
         # 日志标题与操作
@@ -1184,6 +2994,21 @@ class ModernGUI:
         self._menu = tk.Menu(self.root, tearoff=0)
         self._menu.add_command(label='复制全部', command=self._copy_all)
         self._menu.add_command(label='清空日志', command=self.clear_log)
+        self._menu.add_separator()
+        self._menu.add_checkbutton(label='深度性能分析 (cProfile + tracemalloc)', variable=self.profile_mode, command=self._on_profile_toggle)
+        self._menu.add_checkbutton(label='导出追踪 (Chrome trace / Perfetto)', variable=self.trace_mode, command=self._on_trace_toggle)
+
+    def _on_profile_toggle(self):
+        if self.profile_mode.get():
+            print('🔬 下次生成将开启深度性能分析（运行会明显变慢，结果在输出目录/性能分析）')
+        else:
+            print('🔬 已关闭深度性能分析')
+
+    def _on_trace_toggle(self):
+        if self.trace_mode.get():
+            print('🧭 下次生成将导出追踪文件（输出目录/性能分析/trace.json，可用 chrome://tracing 或 Perfetto 打开）')
+        else:
+            print('🧭 已关闭追踪导出')
 
     def _popup_menu(self, event):
         import tkinter as tk
@@ -1263,6 +3088,11 @@ class ModernGUI:
 
         empire = self.empire_name.get().strip()
         include_year = self.include_year.get()
+        chapters = self.chapter_mode.get()
+        split_chapters = chapters and self.split_chapter_mode.get()
+        country = self.country_choice.get().strip()
+        profile = self.profile_mode.get()
+        trace = self.trace_mode.get()
         
         # 步骤1：显示用户选择对话框
         print('🔧 请选择生成模式...')
@@ -1282,6 +3112,7 @@ class ModernGUI:
             try:
                 # 临时创建生成器进行分析
                 temp_gen = StellarisChronicleGenerator()  # type: ignore
+                temp_gen.set_country(country)
                 if not temp_gen.parse_save_file(save_file):
                     print('❌ 存档解析失败，无法进行手动输入分析')
                     return
@@ -1315,17 +3146,29 @@ class ModernGUI:
         print(f'输出目录: {out_dir}')
         print(f'玩家帝国: {empire or "玩家帝国(默认)"}')
         print(f'年度标记: {"包含" if include_year else "不包含"}')
+        if country:
+            print(f'国家: {country}')
         print(f'生成模式: {"随机生成" if generation_mode == "random" else "手动输入"}')
 
         self._lock_ui(True)
         self._set_status('运行中...', '#e0b458')
         self._update_progress(0, '初始化')
         self._start_spinner()
+        token = CancellationToken()
+        self.cancel_token = token
 
         def task():
             success = False
             try:
                 gen = StellarisChronicleGenerator()  # type: ignore
+                gen.set_progress_callback(self._on_progress)
+                gen.set_cancel_token(token)
+                if profile:
+                    gen.enable_profiling(out_dir)
+                if trace:
+                    tracer = gen.enable_tracing(out_dir)
+                    if self.logger:  # 界面日志刷新也记录到同一份追踪
+                        self.logger.tracer = tracer
                 self._set_step(5, '设置参数')
                 
                 # 设置生成模式
@@ -1344,23 +3187,17 @@ class ModernGUI:
                 if empire:
                     gen.set_player_empire_name(empire)
                 gen.set_year_markers_option(include_year)
+                gen.set_chapters(chapters, split_chapters)
+                gen.set_country(country)
                 
-                self._set_step(15, '解析存档')
-                if not gen.parse_save_file(save_file):
-                    print('❌ 解析失败，任务终止')
-                else:
-                    self._set_step(45, '初版编年史')
-                    initial = gen.generate_initial_chronicle()
-                    self._set_step(65, '替换占位符')
-                    final = gen.generate_final_chronicle(initial)
-                    self._set_step(80, '生成设定')
-                    entities = gen.generate_entities_settings_file()
-                    self._set_step(90, '保存文件')
-                    gen.save_chronicle_files(final, entities, out_dir)
+                # 各阶段进度由生成器通过 _on_progress 按真实字节/事件数汇报
+                if gen.run_pipeline(save_file, out_dir):
                     self._set_step(100, '完成')
                     print('\n🎉 生成完成 (Modern Enhanced)!')
                     print(f'输出目录: {out_dir}')
                     success = True
+            except GenerationCancelled:
+                print('⏹ 任务已取消，未写出输出文件')
             except Exception as e:
                 print(f'❌ 运行过程中发生错误: {e}')
                 traceback.print_exc()
@@ -1368,27 +3205,36 @@ class ModernGUI:
                 self._last_success = success
                 self.root.after(0, self._on_task_finish)
 
-        self.running_thread = threading.Thread(target=task, daemon=True)
+        self.running_thread = threading.Thread(target=task, name='生成任务', daemon=True)
         self.running_thread.start()
 
     # UI 锁定
     def _lock_ui(self, running: bool):
         if running:
             self.run_button.configure(text='生成中...', state='disabled', fg_color='#a6781f')
+            self.cancel_button.configure(state='normal')
             self.open_dir_button.configure(state='disabled')
             self.clear_log_button.configure(state='disabled')
         else:
             self.run_button.configure(text='开始生成', state='normal', fg_color='#3d82f7')
+            self.cancel_button.configure(state='disabled')
             if self._last_success:
                 self.open_dir_button.configure(state='normal')
             self.clear_log_button.configure(state='normal')
             self._stop_spinner()
 
+    def cancel_generation(self):
+        if self.running_thread and self.running_thread.is_alive() and self.cancel_token:
+            self.cancel_token.cancel()
+            self.cancel_button.configure(state='disabled')
+            self._set_status('正在取消...', '#e0b458')
+            print('⏹ 正在取消任务...')
+
     def _set_status(self, text: str, color: str):
         self.status_label.configure(text=f'状态: {text}', text_color=color)
 
     # 进度
-    def _update_progress(self, value: int, step: str):
+    def _update_progress(self, value: float, step: str):
         self.progress_value = value
         self.progress_bar.set(value / 100)
         self.current_step.set(step)
@@ -1396,6 +3242,14 @@ class ModernGUI:
     def _set_step(self, value: int, step: str):
         self.root.after(0, lambda: self._update_progress(value, step))
 
+    def _on_progress(self, info: ProgressInfo):
+        # 工作线程回调（已由生成器节流），切回主线程刷新进度条与状态
+        self.root.after(0, lambda: self._show_progress(info))
+
+    def _show_progress(self, info: ProgressInfo):
+        self._update_progress(info.percent, info.describe())
+        self._set_status(f'运行中... {info.percent:.0f}%', '#e0b458')
+
     # Spinner (按钮动态反馈)
     def _start_spinner(self):
         self._spinner_running = True
@@ -1488,8 +3342,13 @@ class ModernGUI:
 
     # 任务结束
     def _on_task_finish(self):
+        if self.logger:
+            self.logger.tracer = None
         if self._last_success:
             self._set_status('完成', '#4cbf56')
+        elif self.cancel_token and self.cancel_token.cancelled:
+            self._set_status('已取消', '#8aa0b3')
+            self._update_progress(0, '已取消')
         else:
             self._set_status('失败', '#d9534f')
         self._lock_ui(False)
@@ -1507,8 +3366,10 @@ class ModernGUI:
     # 关闭
     def on_close(self):
         if self.running_thread and self.running_thread.is_alive():
-            # 简化不弹窗；可扩展为确认
-            print('⚠ 后台任务仍在运行，直接关闭可能中断。')
+            # 关闭前请求取消，并在有限时间内等待任务清理临时文件
+            if self.cancel_token:
+                self.cancel_token.cancel()
+            self.running_thread.join(timeout=3)
         if self.logger:
             sys.stdout = self.logger._orig_stdout
             sys.stderr = self.logger._orig_stderr
@@ -1519,7 +3380,161 @@ class ModernGUI:
         self.root.mainloop()
 
 
+def run_cli(argv: List[str]) -> int:
+    """命令行模式：无需图形界面依赖，Ctrl+C 会在下一个检查点取消任务且不留下输出文件"""
+    parser = argparse.ArgumentParser(description='群星帝国编年史生成器（命令行模式）')
+    parser.add_argument('save', help='存档文本路径（解压 .sav 得到的 gamestate）')
+    parser.add_argument('-o', '--out', help='输出目录（默认与存档同目录）')
+    parser.add_argument('--empire', default='', help='玩家帝国名称（默认: 玩家帝国）')
+    parser.add_argument('--no-year-markers', action='store_true', help='跳过年度标记事件')
+    parser.add_argument('--exclude', action='append', default=[], metavar='代码', help='排除的事件代码，可逗号分隔或重复给出')
+    parser.add_argument('--only', action='append', default=[], metavar='代码', help='只保留的事件代码，可逗号分隔或重复给出')
+    parser.add_argument('--from', dest='date_from', default='', metavar='日期', help='起始日期（含），如 2250 或 2250.01.01')
+    parser.add_argument('--to', dest='date_to', default='', metavar='日期', help='结束日期（含），如 2300 或 2300.12.31')
+    parser.add_argument('--keep-raw', action='store_true', help='保留事件原文，统计文件中附上未收录事件的原文样例')
+    parser.add_argument('--country', default='', metavar='ID', help='生成指定国家 id 的编年史；all 为每个国家分别输出到子目录（默认: 第一个时间线）')
+    parser.add_argument('--workers', type=int, default=0, metavar='N', help='解析进程数：0 自动（仅超大时间线启用），1 单进程')
+    parser.add_argument('--chapters', action='store_true', help='按事件密度变化与里程碑分章，编年史中加入章标题')
+    parser.add_argument('--split-chapters', action='store_true', help='分章并把每章另存到“编年史分章”目录（含 --chapters）')
+    parser.add_argument('--shard', metavar='century|N', help='另把编年史按世纪或每 N 条事件分片写到“编年史分片”目录，并附年份索引')
+    parser.add_argument('--profile', action='store_true', help='深度性能分析：每个阶段输出 .pstats 与 tracemalloc 内存报告')
+    parser.add_argument('--profile-top', type=int, default=25, metavar='N', help='分析报告列出的条目数（默认 25）')
+    parser.add_argument('--trace', action='store_true', help='导出 Chrome trace-event 追踪（可用 chrome://tracing 或 Perfetto 打开）')
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.save):
+        print(f'❌ 存档文件不存在: {args.save}')
+        return 1
+    out_dir = args.out or os.path.dirname(os.path.abspath(args.save))
+
+    token = CancellationToken()
+    def on_sigint(_sig, _frame):
+        print('\n⏹ 收到中断信号，正在取消...（再按一次 Ctrl+C 强制退出）')
+        token.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGINT, on_sigint)
+
+    def on_progress(info: ProgressInfo):
+        sys.stderr.write(f'\r{info.describe():<60}')
+        sys.stderr.flush()
+
+    gen = StellarisChronicleGenerator()
+    gen.set_progress_callback(on_progress, min_interval=0.5)
+    gen.set_cancel_token(token)
+    if args.profile:
+        gen.enable_profiling(out_dir, args.profile_top)
+    if args.trace:
+        gen.enable_tracing(out_dir)
+    gen.set_generation_mode('random')
+    if args.empire:
+        gen.set_player_empire_name(args.empire)
+    gen.set_year_markers_option(not args.no_year_markers)
+    gen.set_parse_workers(args.workers)
+    gen.set_keep_raw(args.keep_raw)
+    gen.set_country(args.country)
+    gen.set_chapters(args.chapters, args.split_chapters)
+    if args.shard:
+        if args.split_chapters:
+            parser.error('--shard 与 --split-chapters 只能二选一')
+        if args.shard != 'century' and not (args.shard.isdigit() and int(args.shard) > 0):
+            parser.error('--shard 取值为 century 或正整数')
+        gen.set_sharding('century' if args.shard == 'century' else int(args.shard))
+    codes = lambda items: {c.strip() for item in items for c in item.split(',') if c.strip()}
+    gen.set_event_filter(FilterSpec(codes(args.exclude), codes(args.only), args.date_from, args.date_to))
+    try:
+        ok = gen.run_pipeline(args.save, out_dir)
+    except GenerationCancelled:
+        print('\n⏹ 任务已取消，未写出输出文件')
+        return 130
+    sys.stderr.write('\n')
+    if ok:
+        print(f'🎉 生成完成！输出目录: {out_dir}')
+    return 0 if ok else 1
+
+
+def run_ndjson_cli(argv: List[str]) -> int:
+    """ndjson 子命令：把存档的指定顶层段流式转换为 NDJSON，内存只与单个条目大小有关"""
+    parser = argparse.ArgumentParser(prog='ndjson', description='把存档中的段落流式转换为 NDJSON（每行一个条目）')
+    parser.add_argument('save', help='存档文本路径（解压 .sav 得到的 gamestate）')
+    parser.add_argument('-s', '--section', action='append', default=[], metavar='段名', help='要转换的顶层段，可逗号分隔或重复给出（默认: 全部）')
+    parser.add_argument('-o', '--out', help='输出文件（默认: 标准输出）')
+    parser.add_argument('--depth', type=int, default=1, metavar='N', help='按第 N 层拆分为行：0 为每段一行，1 为段内每个条目一行（默认 1）')
+    parser.add_argument('--list', action='store_true', help='只列出顶层段及其大小')
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.save):
+        print(f'❌ 存档文件不存在: {args.save}', file=sys.stderr)
+        return 1
+    with ClausewitzDocument(args.save) as doc:
+        if args.list:
+            for k, v in doc.root.items():
+                if isinstance(v, ClausewitzNode):
+                    print(f'{k}\t{(v.end - v.start) / 1048576:.2f} MB')
+            return 0
+        sections = {s.strip() for item in args.section for s in item.split(',') if s.strip()} or None
+        if sections:
+            missing = sorted(sections - set(doc.root.keys()))
+            if missing:
+                print(f"⚠ 存档中没有这些段: {', '.join(missing)}", file=sys.stderr)
+        out = open(args.out, 'w', encoding='utf-8') if args.out else open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+        writer = NdjsonWriter(out, max(0, args.depth))
+        t0 = time.perf_counter()
+        try:
+            with out:
+                ClausewitzStreamParser(doc).parse(writer, sections)
+        except BrokenPipeError:
+            return 0  # 输出被管道下游提前关闭（如 | head）
+    print(f'✅ 已输出 {writer.lines} 行，用时 {time.perf_counter() - t0:.2f}s' + (f': {args.out}' if args.out else ''), file=sys.stderr)
+    return 0
+
+
+def run_query_cli(argv: List[str]) -> int:
+    """query 子命令：在存档上执行路径查询，命中即逐行输出 NDJSON"""
+    parser = argparse.ArgumentParser(prog='query', description='在存档上执行路径查询，如 country.*.name 或 timeline_events[definition=timeline_first_contact].date')
+    parser.add_argument('save', help='存档文本路径（解压 .sav 得到的 gamestate）')
+    parser.add_argument('expr', help='查询表达式：. 分隔各步，* 任意子项，** 任意多层，[键=值] 过滤（另有 != < <= > >= 与 [键]）')
+    parser.add_argument('-o', '--out', help='输出文件（默认: 标准输出）')
+    parser.add_argument('--limit', type=int, default=0, metavar='N', help='最多输出 N 条（默认不限）')
+    parser.add_argument('--count', action='store_true', help='只输出命中条数')
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.save):
+        print(f'❌ 存档文件不存在: {args.save}', file=sys.stderr)
+        return 1
+    try:
+        query = ClausewitzQuery(args.expr)
+    except ValueError as e:
+        print(f'❌ {e}', file=sys.stderr)
+        return 2
+    n = 0
+    t0 = time.perf_counter()
+    with ClausewitzDocument(args.save) as doc:
+        out = open(args.out, 'w', encoding='utf-8') if args.out else open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+        try:
+            with out:
+                for path, value in query.run(doc):
+                    n += 1
+                    if not args.count:
+                        value = value.to_python() if isinstance(value, ClausewitzNode) else value
+                        out.write(json.dumps({'path': path, 'value': value}, ensure_ascii=False) + '\n')
+                    if n == args.limit:
+                        break
+                if args.count:
+                    out.write(f'{n}\n')
+        except BrokenPipeError:
+            return 0
+    print(f'✅ 命中 {n} 条，用时 {time.perf_counter() - t0:.2f}s', file=sys.stderr)
+    return 0
+
+
+SUBCOMMANDS = {'ndjson': run_ndjson_cli, 'query': run_query_cli}
+
+
 def main():
+    multiprocessing.freeze_support()  # 打包为 exe 后，解析进程池的子进程从这里进入
+    if len(sys.argv) > 1:
+        sub = SUBCOMMANDS.get(sys.argv[1])
+        sys.exit(sub(sys.argv[2:]) if sub else run_cli(sys.argv[1:]))
+    if ctk is None:
+        print("请先安装依赖: pip install customtkinter")
+        sys.exit(1)
     app = ModernGUI()
     app.run()
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间线的向量化分析：把解析出的事件转为 NumPy 列式数组（日期序数、事件代码 id、数值载荷），
+在数组上做事件密度、滚动活跃度、各代码首次出现、战争间隔等聚合，并可为每个存档导出紧凑的 .npz
+
+依赖: numpy（仅本模块需要，GUI 与编年史生成不依赖）
+安装: pip install numpy
+
+ - 日期序数按游戏历法计算：每年 12 个月、每月 30 天，序数 = 年 × 360 + (月 − 1) × 30 + (日 − 1)，
+   与核心分章用的是同一个 date_to_ordinal（缺少的月、日按 1 计）；核心在第一次换算日期时才加载，导入本模块不加载 GUI 脚本
+ - 事件代码存为 vocab 中的下标；data 中的 numbers 列表按 CSR 存放（numbers_offsets / numbers_values），
+   第一个数值型引用（planet=171 之类）存为 ref_kind / ref_id，没有时为 -1
+ - 转换只遍历一次事件列表，之后的聚合全部在数组上完成
+
+用法:
+  python 最新版本源码/timeline_analytics.py 存档1.txt 存档2.txt -o 分析输出
+  python 最新版本源码/timeline_analytics.py gamestate.txt --country all -o 分析输出
+
+notebook 中:
+  from timeline_analytics import load_npz, density, rolling_activity, first_occurrence, war_gaps
+  ta = load_npz('分析输出/gamestate.npz'); years, counts = density(ta, 10)
+"""
+
+import os
+import sys
+import json
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # 只在真正转换或聚合时提示安装
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from core_loader import load_core, make_generator, quiet  # noqa: E402
+
+WAR_DEFINITIONS = ('timeline_first_war_declared', 'timeline_war_declared', 'timeline_war_declared_attacker')
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('时间线分析需要 numpy，请先安装依赖: pip install numpy')
+
+
+def _core():
+    """日期换算（DAYS_PER_YEAR / date_to_ordinal / ordinal_to_date）与核心共用，分章与分析对同一日期给出同一序数；
+    核心在第一次用到时加载并由 core_loader 缓存"""
+    return load_core()
+
+
+@dataclass
+class TimelineArrays:
+    """一个国家时间线的列式表示，各数组按事件顺序一一对应（numbers_* 除外）"""
+    ordinals: Any          # int32[n] 日期序数，日期无法识别的事件为 -1
+    definition_ids: Any    # int32[n] 事件代码在 vocab 中的下标
+    vocab: List[str]       # 事件代码表
+    numbers_offsets: Any   # int64[n + 1] 第 i 个事件的 numbers 为 numbers_values[offsets[i]:offsets[i + 1]]
+    numbers_values: Any    # int64[m]
+    ref_kind: Any          # int32[n] 第一个数值型引用的键在 ref_kinds 中的下标，无引用为 -1
+    ref_id: Any            # int64[n] 该引用的 id，无引用为 -1
+    ref_kinds: List[str]
+    save: str = ''
+    country: str = ''
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any], save: str = '', country: str = '') -> 'TimelineArrays':
+        """由 TimelineEvent 序列构建（只需 date / definition / data 属性），只遍历一次"""
+        _require_numpy()
+        date_to_ordinal = _core().date_to_ordinal
+        vocab: Dict[str, int] = {}; kinds: Dict[str, int] = {}
+        ordinals: List[int] = []; ids: List[int] = []
+        offsets: List[int] = [0]; values: List[int] = []
+        ref_kind: List[int] = []; ref_id: List[int] = []
+        for ev in events:
+            ordinals.append(date_to_ordinal(ev.date))
+            ids.append(vocab.setdefault(ev.definition, len(vocab)))
+            kind, rid = -1, -1
+            for k, v in ev.data.items():
+                if k == 'numbers':
+                    values.extend(v)
+                elif kind < 0 and isinstance(v, str) and v.isdigit():
+                    kind, rid = kinds.setdefault(k, len(kinds)), int(v)
+            offsets.append(len(values))
+            ref_kind.append(kind); ref_id.append(rid)
+        return cls(np.array(ordinals, dtype=np.int32), np.array(ids, dtype=np.int32), list(vocab),
+                   np.array(offsets, dtype=np.int64), np.array(values, dtype=np.int64),
+                   np.array(ref_kind, dtype=np.int32), np.array(ref_id, dtype=np.int64), list(kinds), save, country)
+
+    def mask(self, definitions: Iterable[str]):
+        """属于给定事件代码之一的事件的布尔掩码"""
+        names = set(definitions)
+        wanted = [i for i, d in enumerate(self.vocab) if d in names]
+        return np.isin(self.definition_ids, wanted)
+
+    def years(self):
+        """各事件的年份；日期无法识别的事件为 -1"""
+        return np.where(self.ordinals >= 0, self.ordinals // _core().DAYS_PER_YEAR, -1)
+
+
+def save_npz(path: str, ta: TimelineArrays):
+    _require_numpy()
+    np.savez_compressed(path, ordinals=ta.ordinals, definition_ids=ta.definition_ids, vocab=np.array(ta.vocab, dtype=str),
+                        numbers_offsets=ta.numbers_offsets, numbers_values=ta.numbers_values,
+                        ref_kind=ta.ref_kind, ref_id=ta.ref_id, ref_kinds=np.array(ta.ref_kinds, dtype=str),
+                        meta=np.array([ta.save, ta.country], dtype=str))
+
+
+def load_npz(path: str) -> TimelineArrays:
+    _require_numpy()
+    with np.load(path) as z:
+        save, country = (str(x) for x in z['meta'])
+        return TimelineArrays(z['ordinals'], z['definition_ids'], [str(x) for x in z['vocab']],
+                              z['numbers_offsets'], z['numbers_values'], z['ref_kind'], z['ref_id'],
+                              [str(x) for x in z['ref_kinds']], save, country)
+
+
+# ---- 向量化聚合 ----
+
+def definition_counts(ta: TimelineArrays) -> Dict[str, int]:
+    counts = np.bincount(ta.definition_ids, minlength=len(ta.vocab))
+    return {ta.vocab[i]: int(counts[i]) for i in np.argsort(-counts, kind='stable') if counts[i]}
+
+
+def density(ta: TimelineArrays, bin_years: int = 1) -> Tuple[Any, Any]:
+    """事件密度直方图：(各区间起始年份, 事件数)；区间连续，无事件的区间计 0"""
+    years = ta.years()
+    years = years[years >= 0]
+    if not len(years):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    y0 = int(years.min()) // bin_years * bin_years
+    counts = np.bincount((years - y0) // bin_years)
+    return y0 + np.arange(len(counts)) * bin_years, counts
+
+
+def rolling_activity(ta: TimelineArrays, window_years: int = 10) -> Tuple[Any, Any]:
+    """逐年的滚动活跃度：(年份, 截至该年的 window_years 年内事件数)"""
+    years, counts = density(ta, 1)
+    csum = np.concatenate(([0], np.cumsum(counts)))
+    idx = np.arange(1, len(counts) + 1)
+    return years, csum[idx] - csum[np.maximum(0, idx - window_years)]
+
+
+def first_occurrence(ta: TimelineArrays) -> Dict[str, str]:
+    """各事件代码第一次出现的日期，按日期排序"""
+    valid = ta.ordinals >= 0
+    ords, ids = ta.ordinals[valid], ta.definition_ids[valid]
+    order = np.argsort(ords, kind='stable')
+    uniq, first = np.unique(ids[order], return_index=True)
+    firsts = ords[order][first]
+    ordinal_to_date = _core().ordinal_to_date
+    return {ta.vocab[uniq[i]]: ordinal_to_date(firsts[i]) for i in np.argsort(firsts, kind='stable')}
+
+
+def war_gaps(ta: TimelineArrays, definitions: Iterable[str] = WAR_DEFINITIONS) -> Any:
+    """相邻两次宣战之间相隔的天数（同一天的多次宣战间隔为 0）"""
+    ords = np.sort(ta.ordinals[ta.mask(definitions) & (ta.ordinals >= 0)])
+    return np.diff(ords)
+
+
+def summarize(ta: TimelineArrays) -> Dict[str, Any]:
+    """单个存档的概要，命令行输出与批量对比用"""
+    decades, per_decade = density(ta, 10)
+    gaps = war_gaps(ta)
+    valid = ta.ordinals[ta.ordinals >= 0]
+    ordinal_to_date = _core().ordinal_to_date
+    return {
+        'save': ta.save, 'country': ta.country, 'events': len(ta),
+        'first_date': ordinal_to_date(valid.min()) if len(valid) else None,
+        'last_date': ordinal_to_date(valid.max()) if len(valid) else None,
+        'busiest_decade': int(decades[per_decade.argmax()]) if len(per_decade) else None,
+        'busiest_decade_events': int(per_decade.max()) if len(per_decade) else 0,
+        'wars': int(ta.mask(WAR_DEFINITIONS).sum()),
+        'median_war_gap_days': float(np.median(gaps)) if len(gaps) else None,
+    }
+
+
+def timelines_from_save(path: str, country: str = '', workers: int = 0) -> List[TimelineArrays]:
+    """用内嵌核心解析存档，每个选中的国家时间线转换为一份 TimelineArrays"""
+    gen = make_generator(country=country, parse_workers=workers)
+    with quiet():
+        if not gen.parse_save_file(path):
+            raise RuntimeError(f'解析失败: {path}')
+    name = os.path.basename(path)
+    return [TimelineArrays.from_events(tl.events, name, tl.country) for tl in gen.country_timelines]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='把存档时间线导出为 .npz 并输出向量化统计概要')
+    parser.add_argument('saves', nargs='+', help='存档文本路径（解压 .sav 得到的 gamestate），可给多个')
+    parser.add_argument('-o', '--out', default='时间线分析', help='.npz 输出目录（默认: 时间线分析）')
+    parser.add_argument('--country', default='', help="国家 id，或 all 为每个国家各导出一份（默认: 第一个时间线）")
+    parser.add_argument('--workers', type=int, default=0, help='解析进程数，0 为自动')
+    parser.add_argument('--summary', metavar='PATH', help='把各存档概要另存为 JSON')
+    args = parser.parse_args(argv)
+    if np is None:
+        print('❌ 时间线分析需要 numpy，请先安装依赖: pip install numpy', file=sys.stderr)
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    summaries = []
+    for path in args.saves:
+        if not os.path.isfile(path):
+            print(f'❌ 存档文件不存在: {path}', file=sys.stderr)
+            return 1
+        stem = os.path.splitext(os.path.basename(path))[0]
+        timelines = timelines_from_save(path, args.country, args.workers)
+        for ta in timelines:
+            out = os.path.join(args.out, f'{stem}.npz' if len(timelines) == 1 else f'{stem}_国家_{ta.country}.npz')
+            save_npz(out, ta)
+            s = summarize(ta); summaries.append(s)
+            gap = f"{s['median_war_gap_days'] / _core().DAYS_PER_YEAR:.1f} 年" if s['median_war_gap_days'] is not None else '-'
+            print(f"📊 {os.path.basename(out)}: {s['events']} 个事件 {s['first_date']} ~ {s['last_date']}，"
+                  f"最活跃 {s['busiest_decade']}s（{s['busiest_decade_events']} 个），宣战 {s['wars']} 次，间隔中位数 {gap}")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+        print(f"✅ 概要已保存: {args.summary}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())